@@ -48,6 +48,13 @@ parser.add_argument(
     metavar='SECONDS',
     default=300,
     help='device read timeout [default=300]')
+parser.add_argument(
+    '--output_limit',
+    type=int,
+    metavar='MB',
+    default=16,
+    help='device output kept in memory (and in the database) per result, '
+         'the rest is written to a file in campaign-data [default=16]')
 parser.add_argument(
     '--attempts',
     type=int,
@@ -460,6 +467,24 @@ new_simics_campaign.add_argument(
     default=1000,
     help='number of gold checkpoints to target for creation '
          '(actual number of checkpoints may be different) [default=1000]')
+new_simics_campaign.add_argument(
+    '--host_files',
+    action='store_true',
+    help='reserve DUT memory for retrieving files from the RAM image on the '
+         'host instead of SCP (only supported for p2020)')
+new_simics_campaign.add_argument(
+    '--liveness',
+    type=int,
+    metavar='CYCLES',
+    help='trace the first CYCLES cycles after each gold checkpoint to record '
+         'which general purpose registers are overwritten before they are '
+         'read (see "--prune")')
+new_simics_campaign.add_argument(
+    '--merge_all',
+    action='store_true',
+    help='merge every gold checkpoint in parallel after creating them instead '
+         'of on first use, for injecting with "--compare_all" or "--converge" '
+         '(see also the "merge" command)')
 new_campaign.set_defaults(func='create_campaign')
 
 inject = subparsers.add_parser(
@@ -518,6 +543,12 @@ inject.add_argument(
     default=1,
     help='number of injections to perform in parallel '
          '(only supported for openocd and Simics)')
+inject.add_argument(
+    '--data_quota',
+    type=float,
+    metavar='GB',
+    help='evict the least recently used result files when campaign-data '
+         'exceeds this size')
 inject_simics = inject.add_argument_group(
     'Simics campaigns',
     'Additional options for Simics campaigns only')
@@ -532,6 +563,75 @@ inject_simics.add_argument(
     action='store_true',
     dest='extract_blocks',
     help='extract diff memory blocks')
+inject_simics.add_argument(
+    '-m', '--no_merge',
+    action='store_false',
+    dest='merge',
+    help='compare incremental checkpoints without merging them, RAM images '
+         'are assembled from the gold checkpoint chain instead')
+inject_simics.add_argument(
+    '--sub_checkpoint',
+    action='store_true',
+    help='inject at a random cycle between gold checkpoints by '
+         'fast-forwarding from the preceding checkpoint in-session '
+         '(implies "--live_injection", not supported for cache campaigns)')
+inject_simics.add_argument(
+    '--host_files',
+    action='store_true',
+    help='retrieve output and log files from the RAM image on the host '
+         'instead of SCP, if the campaign was created with "--host_files" '
+         '(SCP is used otherwise)')
+inject_simics.add_argument(
+    '--live_injection',
+    action='store_true',
+    help='inject faults by setting attributes in a running Simics session '
+         'loaded from the gold checkpoint instead of editing a copy of the '
+         'checkpoint (not supported for cache campaigns)')
+inject_simics.add_argument(
+    '--prune',
+    action='store_true',
+    help='log injections into registers that are overwritten before they are '
+         'read as masked without simulating them, if the campaign was created '
+         'with "--liveness" (only with one injection per iteration)')
+inject_simics.add_argument(
+    '--memoize',
+    action='store_true',
+    help='reuse the outcome of a previous result with the same injection '
+         'instead of simulating it again (only with one injection per '
+         'iteration)')
+inject_simics.add_argument(
+    '--max_speed',
+    action='store_true',
+    help='disable real-time mode while simulating to and comparing '
+         'checkpoints, it is only enabled while the DUT interacts with the '
+         'host')
+inject_simics.add_argument(
+    '--converge',
+    action='store_true',
+    help='compare the injected state to gold at every checkpoint after the '
+         'last injection and stop with "Masked faults" as soon as they match')
+inject_simics.add_argument(
+    '--persistent_simics',
+    action='store_true',
+    help='keep Simics running between iterations and restart it in place '
+         'instead of launching a new process for each injection')
+inject_simics.add_argument(
+    '--licenses',
+    type=int,
+    help='maximum number of Simics processes to run at once across all '
+         'injection processes (waits for a free license instead of retrying)')
+inject_simics.add_argument(
+    '--staging',
+    metavar='DIRECTORY',
+    help='stage injected checkpoints in DIRECTORY (e.g. a tmpfs such as '
+         '/dev/shm) while it has free space')
+inject_simics.add_argument(
+    '--workspace_quota',
+    type=float,
+    metavar='GB',
+    help='evict the least recently used merged gold checkpoints when '
+         'simics-workspace exceeds this size (they are merged again if '
+         'needed)')
 inject.set_defaults(func='inject_campaign')
 
 supervise = subparsers.add_parser(
@@ -668,6 +768,32 @@ regenerate.add_argument(
     help='result to regenerate')
 regenerate.set_defaults(func='regenerate')
 
+merge = subparsers.add_parser(
+    'merge', aliases=['M'],
+    help='merge gold checkpoints in parallel '
+         '(only supported for Simics campaigns)',
+    description='merge gold checkpoints in parallel '
+                '(only supported for Simics campaigns)')
+merge.add_argument(
+    '-p', '--processes',
+    type=int,
+    help='number of checkpoints to merge in parallel [default=4]')
+merge.set_defaults(func='merge_checkpoints')
+
+cost = subparsers.add_parser(
+    'cost',
+    help='estimate the fast-forward and disk cost of gold checkpoint '
+         'densities for sub-checkpoint injection '
+         '(only supported for Simics campaigns)',
+    description='estimate the fast-forward and disk cost of gold checkpoint '
+                'densities for sub-checkpoint injection '
+                '(only supported for Simics campaigns)')
+cost.add_argument(
+    '-r', '--rate',
+    type=float,
+    help='simulation rate in cycles per second for estimating time')
+cost.set_defaults(func='checkpoint_cost')
+
 update = subparsers.add_parser(
     'update', aliases=['u'],
     help='update gold checkpoint dependency paths '
@@ -780,6 +906,8 @@ def get_options():
         options.command = 'power'
     elif options.command == 'm':
         options.command = 'minicom'
+    elif options.command == 'M':
+        options.command = 'merge'
     if system() == 'Darwin' and options.db_superuser == 'postgres':
         options.db_superuser = getuser()
     if options.db_ask:
@@ -20,6 +20,8 @@ OF SUCH DAMAGE.
 
 from datetime import datetime
 from django.core.management import execute_from_command_line as django_command
+from django.db import transaction
+from django.db.models import Q
 from django.db.utils import OperationalError, ProgrammingError
 from getpass import getuser
 from io import StringIO
@@ -34,6 +36,14 @@ from time import sleep
 from traceback import format_exc, format_stack, print_exc
 
 from .log.models import campaign as campaign_model
+from .log.models import output_chunk as output_chunk_model
+from .log.models import output_fields
+from .log.models import result as result_model
+from .log.models import simics_memory_diff as memory_diff_model
+from .log.models import simics_memory_diff_range as memory_diff_range_model
+from .log.models import simics_register_diff as register_diff_model
+from .log.models import \
+    simics_register_diff_group as register_diff_group_model
 
 
 def initialize_database(options):
@@ -202,6 +212,10 @@ class database(object):
         self.options = options
         self.campaign = get_campaign(options)
         self.result = None
+        # lengths of the output fields of each campaign and result (by model
+        # and id) that are already in the database
+        self.__saved_output = {}
+        self.__track_output(self.campaign)
         if options.command != 'new':
             self.__create_result(supervisor=options.command == 'supervise')
 
@@ -213,6 +227,11 @@ class database(object):
             dut_serial_port=self.options.dut_serial_port,
             aux_serial_port=self.options.aux_serial_port,
             previous_result=self.result)
+        self.__track_output(self.result)
+
+    def __track_output(self, item):
+        self.__saved_output[item._meta.model_name, item.pk] = {
+            field: len(getattr(item, field)) for field in output_fields}
 
     def log_result(self, supervisor=False, exit=False):
         if self.result.dut_serial_port is None:
@@ -236,7 +255,7 @@ class database(object):
                                               99.990))
             print(colored(out, 'blue'))
         self.result.timestamp = datetime.now()
-        self.save()
+        self.save(consolidate=True)
         if not exit:
             self.__create_result(supervisor)
 
@@ -255,35 +274,183 @@ class database(object):
             success=success)
         return event
 
-    def log_diff(self, checkpoint, config_object, register, gold_value,
-                 monitored_value, attempts=10):
+    def get_finished_results(self):
+        """
+        Returns the (campaign id, result id) of the results of every campaign
+        that are no longer in progress, their files can be evicted.
+        """
+        results = result_model.objects.exclude(
+            outcome='In progress').exclude(outcome_category='Supervisor')
+        if self.result is not None:
+            results = results.exclude(id=self.result.id)
+        return results.values_list('campaign_id', 'id')
+
+    def log_evicted_result(self, result_id, description):
+        """
+        Logs on result result_id (of any campaign) that its files were evicted
+        from campaign-data to meet the data quota.
+        """
+        result = result_model.objects.filter(id=result_id).first()
+        if result is not None:
+            result.event_set.create(
+                description=description,
+                type='Evicted result files',
+                level='Warning',
+                source='DrSEUs')
+
+    def log_register_diffs(self, checkpoint, diffs):
+        """
+        Saves diffs, a list of (config_object, register, gold_value,
+        monitored_value), to the database as one row of arrays per config
+        object.
+        """
+        groups = {}
+        for config_object, register, gold_value, monitored_value in diffs:
+            group = groups.setdefault(config_object, ([], [], []))
+            group[0].append(register)
+            group[1].append(gold_value)
+            group[2].append(monitored_value)
+        self.__bulk_create(register_diff_group_model, [
+            register_diff_group_model(
+                result=self.result, checkpoint=checkpoint,
+                config_object=config_object, registers=registers,
+                gold_values=gold_values, monitored_values=monitored_values)
+            for config_object, (registers, gold_values, monitored_values)
+            in groups.items()])
+
+    def get_reusable_result(self, injection):
+        """
+        Returns the latest finished single injection result of the campaign
+        with an injection at the same checkpoint, offset, config object,
+        register, register index, and bit as injection, or None. Simics is
+        deterministic so such a result has the same outcome. Injections logged
+        before offsets were recorded have no offset and were made at the
+        checkpoint.
+        """
+        if injection.offset:
+            offset = Q(injection__offset=injection.offset)
+        else:
+            offset = Q(injection__offset=0) | Q(injection__offset__isnull=True)
+        return self.campaign.result_set.filter(
+            offset,
+            num_injections=1,
+            injection__success=True,
+            injection__checkpoint=injection.checkpoint,
+            injection__config_object=injection.config_object,
+            injection__register=injection.register,
+            injection__register_index=injection.register_index,
+            injection__bit=injection.bit
+        ).exclude(
+            id=self.result.id
+        ).exclude(
+            outcome_category__in=['Incomplete', 'Simics error', 'DrSEUs',
+                                  'Supervisor']
+        ).order_by('-id').first()
+
+    def reuse_result(self, result):
+        """
+        Copies the outcome, outputs, and diffs of result to the current result.
+        """
+        for field in ('outcome_category', 'outcome', 'returned', 'cycles',
+                      'execution_time', 'data_diff', 'data_hash',
+                      'detected_errors', 'dut_output', 'aux_output',
+                      'num_register_diffs', 'num_memory_diffs'):
+            setattr(self.result, field, getattr(result, field))
+        for model, diffs in (
+                (register_diff_model, result.simics_register_diff_set),
+                (memory_diff_model, result.simics_memory_diff_set),
+                (register_diff_group_model,
+                 result.simics_register_diff_group_set),
+                (memory_diff_range_model,
+                 result.simics_memory_diff_range_set)):
+            copies = list(diffs.all())
+            for diff in copies:
+                diff.pk = None
+                diff.result = self.result
+            self.__bulk_create(model, copies)
+        self.log_event(
+            'Information', 'DrSEUs', 'Reused result',
+            'Outcome and diffs reused from result {} with the same '
+            'injection'.format(result.id))
+
+    def __save_output(self, item, consolidate):
+        model = item._meta.model_name
+        saved = self.__saved_output.get((model, item.pk))
+        lengths = {field: len(getattr(item, field)) for field in output_fields}
+        # output that was replaced instead of appended to cannot be chunked
+        if saved is None or any(lengths[field] < saved[field]
+                                for field in output_fields):
+            consolidate = True
+        with transaction.atomic():
+            if consolidate:
+                item.save()
+                item.output_chunk_set.all().delete()
+            else:
+                output_chunk_model.objects.bulk_create([
+                    output_chunk_model(
+                        field=field, text=getattr(item, field)[saved[field]:],
+                        **{model: item})
+                    for field in output_fields
+                    if lengths[field] > saved[field]])
+                item.save(update_fields=[
+                    field.name for field in item._meta.concrete_fields
+                    if not field.primary_key and
+                    field.name not in output_fields])
+        self.__saved_output[model, item.pk] = lengths
+
+    def log_memory_diffs(self, checkpoint, image_index, blocks, block_size):
+        """
+        Saves blocks, a sorted list of the addresses of memory blocks of size
+        block_size that differ, to the database as runs of contiguous blocks.
+        """
+        ranges = []
+        for block in blocks:
+            if ranges and block == ranges[-1][0] + ranges[-1][1]*block_size:
+                ranges[-1][1] += 1
+            else:
+                ranges.append([block, 1])
+        self.__bulk_create(memory_diff_range_model, [
+            memory_diff_range_model(
+                result=self.result, checkpoint=checkpoint,
+                image_index=image_index, block=hex(block),
+                block_size=block_size, count=count)
+            for block, count in ranges])
+
+    def __bulk_create(self, model, objects, batch_size=1000, attempts=10):
+        if not objects:
+            return
         for attempt in range(attempts):
             try:
-                self.result.simics_register_diff_set.create(
-                    checkpoint=checkpoint, config_object=config_object,
-                    register=register, gold_value=gold_value,
-                    monitored_value=monitored_value)
+                # all or nothing, so a retry cannot duplicate rows
+                with transaction.atomic():
+                    model.objects.bulk_create(objects, batch_size=batch_size)
             except KeyboardInterrupt:
                 raise KeyboardInterrupt
             except Exception as error:
                 print_exc()
                 print(colored(
-                    'Error saving diff to database (attempt {}/{}): {}'.format(
-                        attempt+1, attempts, error), 'red'))
+                    'Error saving {} to database (attempt {}/{}): {}'.format(
+                        model.__name__, attempt+1, attempts, error), 'red'))
                 if attempt < attempts-1:
                     sleep(30)
                 else:
-                    raise Exception('Error saving diff to database')
+                    raise Exception('Error saving {} to database'.format(
+                        model.__name__))
             else:
                 break
 
-    def save(self, attempts=10):
+    def save(self, attempts=10, consolidate=False):
+        """
+        Saves the campaign (while setting it up) or the current result. Only
+        the output appended since the last save is written, as output chunks,
+        unless consolidate is set (the campaign or result is finished), in
+        which case the whole output is written to its fields and the chunks
+        are deleted.
+        """
+        item = self.campaign if self.result is None else self.result
         for attempt in range(attempts):
             try:
-                if self.result is None:
-                    self.campaign.save()
-                else:
-                    self.result.save()
+                self.__save_output(item, consolidate)
             except KeyboardInterrupt:
                 raise KeyboardInterrupt
             except Exception as error:
@@ -18,13 +18,14 @@ OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER
 OF SUCH DAMAGE.
 """
 
+from codecs import getincrementaldecoder
 from datetime import datetime
 from difflib import SequenceMatcher
 from ftplib import FTP
 from hashlib import sha256
 from io import StringIO
 from os import listdir, makedirs, rename
-from os.path import exists, join
+from os.path import basename, dirname, exists, join
 from paramiko import AutoAddPolicy, RSAKey, SSHClient
 from re import compile as regex
 from re import DOTALL, escape
@@ -166,6 +167,10 @@ class dut(object):
         rsakey_file.close()
         self.uboot_command = options.dut_uboot if not aux \
             else options.aux_uboot
+        # optional callable(file_, file_path) that retrieves a file without
+        # the network and returns True if it succeeded (set by Simics), it
+        # drives the console so it is only used while the console is idle
+        self.extract_file = None
         self.login_command = options.dut_login if not aux \
             else options.aux_login
         for message in reversed(self.vxworks_signal_messages if options.vxworks
@@ -173,6 +178,12 @@ class dut(object):
             self.error_messages.insert(0, message)
         for message in reversed(options.error_messages):
             self.error_messages.insert(0, (message, message))
+        # data read past the string read_until stopped at, and the decoder
+        # keeps multi-byte characters split across reads
+        self.__pending = ''
+        self.__spill_file = None
+        self.__decoder = getincrementaldecoder('utf-8')('replace')
+        self.__matchers = {}
         self.open()
 
     def __str__(self):
@@ -262,30 +273,18 @@ class dut(object):
                 raise KeyboardInterrupt
             except:
                 self.serial.reset_input_buffer()
+                self.__pending = ''
             else:
-                if in_bytes:
-                    buff = ''
-                    for b in range(in_bytes):
-                        char = self.serial.read().decode(
-                            'utf-8', 'replace').replace('\x00', '')
-                        buff += char
-                        if self.options.debug:
-                            print(
-                                colored(char,
-                                        'green' if not self.aux else 'cyan'),
-                                end='')
+                if in_bytes or self.__pending:
+                    buff = self.__pending + self.__decoder.decode(
+                        self.serial.read(in_bytes)).replace('\x00', '')
+                    self.__pending = ''
                     if self.options.debug:
+                        print(colored(buff,
+                                      'green' if not self.aux else 'cyan'),
+                              end='')
                         stdout.flush()
-                    if self.db.result is None:
-                        if self.aux:
-                            self.db.campaign.aux_output += buff
-                        else:
-                            self.db.campaign.dut_output += buff
-                    else:
-                        if self.aux:
-                            self.db.result.aux_output += buff
-                        else:
-                            self.db.result.dut_output += buff
+                    self.__append_output(buff)
                     self.db.save()
                     if check_errors:
                         for message, category in self.error_messages:
@@ -478,7 +477,7 @@ class dut(object):
             self.command('mv {0} gold_{0}'.format(self.db.campaign.output_file))
 
     def get_file(self, file_, local_path='', delete=False, attempts=None,
-                 quiet=False):
+                 quiet=False, extract=True):
         if attempts is None:
             attempts = self.options.attempts
 
@@ -626,6 +625,13 @@ class dut(object):
             get_socket()
         elif self.options.vxworks:
             get_ftp()
+        elif extract and self.extract_file is not None and \
+                self.extract_file(file_, file_path):
+            if self.options.debug and not quiet:
+                print(colored('done', 'blue'))
+            self.db.log_event(
+                'Information', 'DUT' if not self.aux else 'AUX',
+                'Received file from RAM image', file_, success=True)
         else:
             get_scp()
         return file_path
@@ -634,6 +640,73 @@ class dut(object):
         self.serial.write(bytes(string, encoding='utf-8'))
         self.start_timer()
 
+    def __matcher(self, string):
+        """
+        Returns a regular expression that matches (without consuming) where
+        any of the strings read_until reacts to starts, along with the
+        strings, so that incoming data is scanned once instead of checking
+        every string after every character.
+        """
+        if string not in self.__matchers:
+            strings = [string, 'autoboot: ', 'login: ', 'Password: ',
+                       '[sudo] password for {}: '.format(self.username),
+                       'can\'t get kernel image']
+            strings.extend(message for message, category
+                           in self.error_messages)
+            strings = sorted(set(strings), key=len, reverse=True)
+            self.__matchers[string] = (
+                regex('(?=(?:{}))'.format('|'.join(map(escape, strings)))),
+                strings)
+        return self.__matchers[string]
+
+    def __append_output(self, text):
+        """
+        Appends text to the output of the current result (or of the campaign
+        while it is set up). Once the output reaches output_limit the rest is
+        only written to a file in campaign-data (which starts with all of the
+        output), so a device flooding its console cannot grow the worker
+        without limit.
+        """
+        field = 'aux_output' if self.aux else 'dut_output'
+        if self.db.result is None:
+            item = self.db.campaign
+            spill_file = 'campaign-data/{}/{}.txt'.format(
+                self.db.campaign.id, field)
+        else:
+            item = self.db.result
+            spill_file = 'campaign-data/{}/results/{}/{}.txt'.format(
+                self.db.campaign.id, self.db.result.id, field)
+        output = getattr(item, field)
+        if self.__spill_file != spill_file:
+            limit = self.options.output_limit << 20
+            if len(output) + len(text) <= limit:
+                setattr(item, field, output + text)
+                return
+            makedirs(dirname(spill_file), exist_ok=True)
+            with open(spill_file, 'w') as spill:
+                spill.write(output)
+            self.__spill_file = spill_file
+            setattr(item, field, '{}\n\n{:*^80}\n'.format(
+                output + text[:max(limit-len(output), 0)],
+                ' Output truncated, see {} '.format(basename(spill_file))))
+            self.db.log_event(
+                'Warning', 'DUT' if not self.aux else 'AUX',
+                'Output truncated', spill_file)
+        else:
+            makedirs(dirname(spill_file), exist_ok=True)
+        with open(spill_file, 'a') as spill:
+            spill.write(text)
+
+    def __count_detected_errors(self, buff):
+        if 'drseus_detected_errors:' in buff:
+            for line in buff.split('\n'):
+                if 'drseus_detected_errors:' in line:
+                    if self.db.result.detected_errors is None:
+                        self.db.result.detected_errors = 0
+                    # TODO: use regular expression
+                    self.db.result.detected_errors += \
+                        int(line.replace('drseus_detected_errors:', ''))
+
     def read_until(self, string=None, continuous=False, boot=False, flush=True):
         start_time = perf_counter()
         if string is None:
@@ -641,102 +714,145 @@ class dut(object):
                 string = '->'
             else:
                 string = self.prompt
+        matcher, strings = self.__matcher(string)
+        longest = len(strings[0])
         buff = ''
         event_buff = ''
-        event_buff_logged = ''
+        # where the text of the next error event starts in buff
+        event_buff_logged = 0
+        # once buff grows past output_limit only its head and a tail window
+        # (long enough to match any string across reads) are kept, along with
+        # the error messages seen in between
+        limit = max(self.options.output_limit << 20, 4*longest)
+        head = None
+        seen = set()
         errors = 0
         hanging = False
         returned = False
         while True:
-            try:
-                with timeout(self.options.timeout+5):
-                    char = self.serial.read().decode(
-                        'utf-8', 'replace').replace('\x00', '')
-            except SerialException:
-                errors += 1
-                self.db.log_event(
-                    'Error', 'DUT' if not self.aux else 'AUX', 'Read error',
-                    self.db.log_exception)
-                self.close()
-                self.open()
-                continue
-            except TimeoutException:
-                char = ''
-            if not char:
-                hanging = True
-                self.db.log_event(
-                    'Error', 'DUT' if not self.aux else 'AUX', 'Read timeout',
-                    self.db.log_trace)
-                if continuous:
+            if self.__pending:
+                chunk = self.__pending
+                self.__pending = ''
+            else:
+                try:
+                    with timeout(self.options.timeout+5):
+                        data = self.serial.read(max(self.serial.in_waiting, 1))
+                except SerialException:
+                    errors += 1
+                    self.db.log_event(
+                        'Error', 'DUT' if not self.aux else 'AUX',
+                        'Read error', self.db.log_exception)
+                    self.close()
+                    self.open()
                     continue
-                else:
+                except TimeoutException:
+                    data = b''
+                if not data:
+                    hanging = True
+                    self.db.log_event(
+                        'Error', 'DUT' if not self.aux else 'AUX',
+                        'Read timeout', self.db.log_trace)
+                    if continuous:
+                        continue
+                    else:
+                        break
+                chunk = self.__decoder.decode(data).replace('\x00', '')
+            start = len(buff)
+            buff += chunk
+            # the positions in the new data where any of the strings end, the
+            # checks below are made at each of them in order as if the data
+            # had been read one character at a time
+            ends = sorted({
+                match.start()+len(item)
+                for match in matcher.finditer(buff, max(start-longest+1, 0))
+                for item in strings if buff.startswith(item, match.start())
+                and match.start()+len(item) > start})
+            stop = None
+            for end in ends:
+                if not continuous and buff.endswith(string, 0, end):
+                    returned = True
+                    stop = end
                     break
-            if self.db.result is None:
-                if self.aux:
-                    self.db.campaign.aux_output += char
-                else:
-                    self.db.campaign.dut_output += char
-            else:
-                if self.aux:
-                    self.db.result.aux_output += char
-                else:
-                    self.db.result.dut_output += char
+                elif buff.endswith('autoboot: ', 0, end) and \
+                        self.uboot_command:
+                    self.write('\n')
+                    sleep(1)
+                    self.write('{}\n'.format(self.uboot_command))
+                    self.db.log_event(
+                        'Information', 'DUT' if not self.aux else 'AUX',
+                        'Command', self.uboot_command)
+                elif buff.endswith('login: ', 0, end):
+                    self.write('{}\n'.format(self.username))
+                    self.db.log_event(
+                        'Information', 'DUT' if not self.aux else 'AUX',
+                        'Logged in', self.username)
+                    if not boot:
+                        errors += 1
+                elif buff.endswith('Password: ', 0, end):
+                    self.write('{}\n'.format(self.password))
+                elif buff.endswith('[sudo] password for {}: '.format(
+                        self.username), 0, end):
+                    self.write('{}\n'.format(self.password))
+                elif buff.endswith('can\'t get kernel image', 0, end):
+                    self.write('reset\n')
+                    self.db.log_event(
+                        'Information', 'DUT' if not self.aux else 'AUX',
+                        'Command', 'reset')
+                    errors += 1
+                for message, category in self.error_messages:
+                    if buff.endswith(message, 0, end):
+                        if category == 'Missing file on device' and \
+                                buff.endswith(
+                                    "hwclock: can't open '/dev/misc/rtc': "
+                                    "No such file or directory", 0, end):
+                            continue
+                        seen.add(message)
+                        if boot:
+                            if category == 'Reboot':
+                                continue
+                        elif not continuous:
+                            self.serial.timeout = 30
+                            errors += 1
+                        event_buff = buff[event_buff_logged:end]
+                        self.db.log_event(
+                            'Warning' if boot else 'Error',
+                            'DUT' if not self.aux else 'AUX', category,
+                            event_buff)
+                        event_buff_logged = end
+                if not continuous and errors > 10:
+                    stop = end
+                    break
+            if stop is None and not continuous and (
+                    errors > 10 or (errors and perf_counter() - start_time >
+                                    self.options.timeout)):
+                stop = len(buff)
+            # anything after where reading stopped is left for the next read
+            if stop is not None:
+                self.__pending = buff[stop:]
+                buff = buff[:stop]
+            chunk = buff[start:]
+            self.__append_output(chunk)
             if self.options.debug:
-                print(colored(char, 'green' if not self.aux else 'cyan'),
+                print(colored(chunk, 'green' if not self.aux else 'cyan'),
                       end='')
                 if flush:
                     stdout.flush()
-            buff += char
-            if not continuous and buff.endswith(string):
-                returned = True
-                break
-            elif buff.endswith('autoboot: ') and self.uboot_command:
-                self.write('\n')
-                sleep(1)
-                self.write('{}\n'.format(self.uboot_command))
-                self.db.log_event(
-                    'Information', 'DUT' if not self.aux else 'AUX', 'Command',
-                    self.uboot_command)
-            elif buff.endswith('login: '):
-                self.write('{}\n'.format(self.username))
-                self.db.log_event(
-                    'Information', 'DUT' if not self.aux else 'AUX',
-                    'Logged in', self.username)
-                if not boot:
-                    errors += 1
-            elif buff.endswith('Password: '):
-                self.write('{}\n'.format(self.password))
-            elif buff.endswith('[sudo] password for {}: '.format(
-                    self.username)):
-                self.write('{}\n'.format(self.password))
-            elif buff.endswith('can\'t get kernel image'):
-                self.write('reset\n')
-                self.db.log_event(
-                    'Information', 'DUT' if not self.aux else 'AUX', 'Command',
-                    'reset')
-                errors += 1
-            for message, category in self.error_messages:
-                if buff.endswith(message):
-                    if category == 'Missing file on device' and buff.endswith(
-                            "hwclock: can't open '/dev/misc/rtc': "
-                            "No such file or directory"):
-                        continue
-                    if boot:
-                        if category == 'Reboot':
-                            continue
-                    elif not continuous:
-                        self.serial.timeout = 30
-                        errors += 1
-                    event_buff = buff.replace(event_buff_logged, '')
-                    self.db.log_event(
-                        'Warning' if boot else 'Error',
-                        'DUT' if not self.aux else 'AUX', category, event_buff)
-                    event_buff_logged += event_buff
-            if not continuous and errors > 10:
-                break
-            if not continuous and errors and \
-                    perf_counter() - start_time > self.options.timeout:
+            if stop is not None:
                 break
+            if len(buff) > limit:
+                # cut at line boundaries where possible so that
+                # drseus_detected_errors lines are counted whole
+                keep = limit // 2
+                if head is None:
+                    split = buff.rfind('\n', 0, keep) + 1 or keep
+                    head = buff[:split]
+                else:
+                    split = 0
+                cut = buff.rfind('\n', split, len(buff)-keep) + 1 or \
+                    len(buff)-keep
+                self.__count_detected_errors(buff[split:cut])
+                buff = buff[cut:]
+                event_buff_logged = max(event_buff_logged-cut, 0)
             # if not boot and buff and buff.endswith('\n'):
             #     self.db.save()
         self.stop_timer()
@@ -753,21 +869,16 @@ class dut(object):
                 self.open()
         if self.options.debug:
             print()
-        if 'drseus_detected_errors:' in buff:
-            for line in buff.split('\n'):
-                if 'drseus_detected_errors:' in line:
-                    if self.db.result.detected_errors is None:
-                        self.db.result.detected_errors = 0
-                    # TODO: use regular expression
-                    self.db.result.detected_errors += \
-                        int(line.replace('drseus_detected_errors:', ''))
+        if head is not None:
+            buff = head + buff
+        self.__count_detected_errors(buff)
         self.db.save()
         if errors:
             for message, category in self.error_messages:
                 if not (boot and category in ('Error booting', 'Reboot')) and \
-                        message in buff.replace(
+                        (message in seen or message in buff.replace(
                             "hwclock: can't open '/dev/misc/rtc': "
-                            "No such file or directory", ''):
+                            "No such file or directory", '')):
                     raise DrSEUsError(category, returned=returned)
         if hanging:
             raise DrSEUsError('Hanging', returned=returned)
@@ -957,7 +1068,7 @@ class dut(object):
                 file_path = self.get_file(
                     log_file, result_folder,
                     delete=not background and not log_file.startswith('/'),
-                    quiet=background)
+                    quiet=background, extract=not background)
             except DrSEUsError:
                 if not listdir(result_folder):
                     rmtree(result_folder)
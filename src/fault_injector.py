@@ -31,6 +31,7 @@ from .jtag.bdi import bdi
 from .jtag.dummy import dummy
 from .jtag.openocd import openocd
 from .simics import simics
+from .storage import storage
 
 
 class fault_injector(object):
@@ -79,6 +80,10 @@ class fault_injector(object):
             result_items += self.db.result.injection_set.count()
             result_items += self.db.result.simics_memory_diff_set.count()
             result_items += self.db.result.simics_register_diff_set.count()
+            result_items += \
+                self.db.result.simics_memory_diff_range_set.count()
+            result_items += \
+                self.db.result.simics_register_diff_group_set.count()
             if result_items or self.db.result.dut_output or \
                     self.db.result.aux_output or self.db.result.debugger_output:
                 if self.db.result.outcome == 'In progress':
@@ -86,6 +91,7 @@ class fault_injector(object):
                     self.db.result.outcome = 'Exited'
                 self.db.log_result(exit=True)
             else:
+                self.db.result.output_chunk_set.all().delete()
                 self.db.result.delete()
 
     def setup_campaign(self):
@@ -203,7 +209,7 @@ class fault_injector(object):
         if self.db.campaign.aux and self.options.aux_readonly:
             self.debugger.aux.flush()
         self.db.campaign.timestamp = datetime.now()
-        self.db.save()
+        self.db.save(consolidate=True)
         self.close()
 
     def inject_campaign(self, iteration_counter=None, timer=None):
@@ -350,11 +356,16 @@ class fault_injector(object):
                 global incomplete
                 incomplete = True
                 log_thread = Thread(target=background_log)
+                if self.db.campaign.simics:
+                    self.storage.stage(
+                        'simics-workspace/injected-checkpoints/{}/{}'.format(
+                            self.db.campaign.id, self.db.result.id))
                 try:
                     (self.db.result.num_register_diffs,
                      self.db.result.num_memory_diffs, persistent_faults) = \
                         self.debugger.inject_faults()
-                    if self.options.log_delay is not None:
+                    if self.options.log_delay is not None and \
+                            self.db.result.outcome == 'In progress':
                         log_thread.start()
                 except DrSEUsError as error:
                     self.db.result.outcome = str(error)
@@ -377,26 +388,34 @@ class fault_injector(object):
                         except DrSEUsError:
                             pass
                 else:
-                    if not self.db.campaign.command:
+                    # the outcome is already known if the simulation converged
+                    # with the gold run or an identical injection was reused
+                    converged = self.db.result.outcome != 'In progress'
+                    if not self.db.campaign.command and not converged:
                         sleep_time = (self.db.campaign.execution_time -
                                       (perf_counter()-start))
                         if sleep_time > 0:
                             sleep(sleep_time)
-                    monitor_execution(persistent_faults, True)
+                    if not converged:
+                        monitor_execution(persistent_faults, True)
                     incomplete = False
-                    if self.options.log_delay is not None:
+                    if log_thread.is_alive():
                         log_thread.join()
-                    check_latent_faults()
+                    if not converged:
+                        check_latent_faults()
                 if self.db.campaign.simics:
                     try:
-                        self.debugger.close()
+                        # pruned and reused injections never launch Simics
+                        if self.debugger.simics is not None:
+                            self.debugger.close(
+                                self.options.persistent_simics)
                     except DrSEUsError as error:
                         self.db.result.outcome_category = 'Simics error'
                         self.db.result.outcome = str(error)
                     finally:
-                        rmtree('simics-workspace/injected-checkpoints/{}/{}'
-                               ''.format(self.db.campaign.id,
-                                         self.db.result.id))
+                        self.storage.delete(
+                            'simics-workspace/injected-checkpoints/{}/{}'
+                            ''.format(self.db.campaign.id, self.db.result.id))
                 else:
                     try:
                         self.debugger.dut.flush(check_errors=True)
@@ -406,6 +425,7 @@ class fault_injector(object):
                         self.db.result.outcome = error.type
                     if self.db.campaign.aux:
                         self.debugger.aux.flush()
+                self.storage.enforce()
                 if self.options.command == 'supervise' and \
                         self.db.result.outcome in ['Reboot', 'Hanging',
                                                    'Kernel error']:
@@ -427,6 +447,7 @@ class fault_injector(object):
                 self.db.save()
 
     # def inject_campaign(self, iteration_counter=None, timer=None):
+        self.storage = storage(self.options, self.db)
         try:
             perform_injections()
         except KeyboardInterrupt:
@@ -437,8 +458,11 @@ class fault_injector(object):
                 'Information', 'User', 'Interrupted', self.db.log_exception)
             if self.db.campaign.simics:
                 self.debugger.continue_dut()
-            self.debugger.dut.write('\x03')
-            if self.db.campaign.aux and not self.options.aux_readonly:
+            # a persistent Simics process is kept without its consoles
+            if self.debugger.dut:
+                self.debugger.dut.write('\x03')
+            if self.db.campaign.aux and not self.options.aux_readonly and \
+                    self.debugger.aux:
                 self.debugger.aux.write('\x03')
             self.debugger.close()
             self.db.log_result(
@@ -454,3 +478,5 @@ class fault_injector(object):
             self.db.log_result(
                 exit=self.options.command != 'supervise',
                 supervisor=self.options.command == 'supervise')
+        finally:
+            self.storage.close()
@@ -346,12 +346,24 @@ class result(FilterSet):
 class simics_register_diff(FilterSet):
     def __init__(self, *args, **kwargs):
         start = perf_counter()
+        groups = kwargs.pop('groups', None)
         super().__init__(*args, **kwargs)
         checkpoint_choices = choices(kwargs['queryset'], 'checkpoint')
+        register_choices = choices(kwargs['queryset'], 'register')
+        if groups is not None:
+            checkpoint_choices = sorted(
+                set(checkpoint_choices) |
+                {(item, item) for item in groups.values_list(
+                    'checkpoint', flat=True).distinct()},
+                key=fix_sort_list)
+            register_choices = sorted(
+                set(register_choices) |
+                {(item, item) for registers in groups.values_list(
+                    'registers', flat=True) for item in registers},
+                key=fix_sort_list)
         self.filters['checkpoint'].extra.update(choices=checkpoint_choices)
         self.filters['checkpoint'].widget.attrs['size'] = min(
             len(checkpoint_choices), 50)
-        register_choices = choices(kwargs['queryset'], 'register')
         self.filters['register'].extra.update(choices=register_choices)
         self.filters['register'].widget.attrs['size'] = min(
             len(register_choices), 50)
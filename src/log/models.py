@@ -24,8 +24,22 @@ from django.db.models import (BooleanField, BigIntegerField, DateTimeField,
                               NullBooleanField, OneToOneField, SET_NULL,
                               TextField, PROTECT)
 
+output_fields = ('aux_output', 'debugger_output', 'dut_output')
 
-class campaign(Model):
+
+class chunked_output(object):
+    def assemble_output(self):
+        """
+        Appends the output chunks that have not been consolidated yet (the
+        campaign or result is in progress or was interrupted) to the output
+        fields and returns self.
+        """
+        for chunk in self.output_chunk_set.all():
+            setattr(self, chunk.field, getattr(self, chunk.field)+chunk.text)
+        return self
+
+
+class campaign(chunked_output, Model):
     architecture = TextField()
     aux = BooleanField()
     aux_command = TextField(null=True)
@@ -52,7 +66,7 @@ class campaign(Model):
     timestamp = DateTimeField(auto_now_add=True)
 
 
-class result(Model):
+class result(chunked_output, Model):
     aux_output = TextField(default=str)
     aux_serial_port = TextField(null=True)
     campaign = ForeignKey(campaign,on_delete=PROTECT)
@@ -95,6 +109,8 @@ class injection(Model):
     field = TextField(null=True)
     gold_value = TextField(null=True)
     injected_value = TextField(null=True)
+    # cycles past checkpoint at which the fault was injected
+    offset = IntegerField(null=True)
     processor_mode = TextField(null=True)
     register = TextField(null=True)
     register_access = TextField(null=True)
@@ -124,3 +140,63 @@ class simics_memory_diff(Model):
     block = TextField()
     image_index = IntegerField()
     result = ForeignKey(result,on_delete=PROTECT)
+
+
+class simics_register_diff_group(Model):
+    """
+    The register diffs of a config object at a checkpoint, stored as parallel
+    arrays instead of a row per register element.
+    """
+    checkpoint = IntegerField()
+    config_object = TextField()
+    gold_values = ArrayField(TextField())
+    monitored_values = ArrayField(TextField())
+    registers = ArrayField(TextField())
+    result = ForeignKey(result, on_delete=PROTECT)
+
+    def diffs(self):
+        """
+        Yields a dictionary for each register diff in the same form as
+        simics_register_diff.
+        """
+        for register, gold_value, monitored_value in zip(
+                self.registers, self.gold_values, self.monitored_values):
+            yield {'checkpoint': self.checkpoint,
+                   'config_object': self.config_object,
+                   'register': register,
+                   'gold_value': gold_value,
+                   'monitored_value': monitored_value}
+
+
+class simics_memory_diff_range(Model):
+    """
+    A run of count contiguous memory blocks that differ, starting at block.
+    """
+    block = TextField()
+    block_size = IntegerField()
+    checkpoint = IntegerField()
+    count = IntegerField()
+    image_index = IntegerField()
+    result = ForeignKey(result, on_delete=PROTECT)
+
+    def blocks(self):
+        """
+        Yields the address (as a hex string) of every block in the range.
+        """
+        start = int(self.block, base=16)
+        for index in range(self.count):
+            yield hex(start + index*self.block_size)
+
+
+class output_chunk(Model):
+    """
+    Output appended to a field of output_fields of a campaign or result since
+    it was last saved, consolidated into the field when it is finished.
+    """
+    campaign = ForeignKey(campaign, null=True, on_delete=PROTECT)
+    field = TextField()
+    result = ForeignKey(result, null=True, on_delete=PROTECT)
+    text = TextField()
+
+    class Meta:
+        ordering = ['id']
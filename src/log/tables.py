@@ -273,9 +273,10 @@ class injection(Table):
         return '{0:.6f}'.format(record.time)
 
     class Meta:
-        fields = ('timestamp', 'time', 'checkpoint', 'target_name', 'register',
-                  'register_index', 'bit', 'field', 'register_access',
-                  'gold_value', 'injected_value', 'success_')
+        fields = ('timestamp', 'time', 'checkpoint', 'offset', 'target_name',
+                  'register', 'register_index', 'bit', 'field',
+                  'register_access', 'gold_value', 'injected_value',
+                  'success_')
         model = models.injection
         order_by = 'id'
         template = 'django_tables2/bootstrap.html'
@@ -294,3 +295,10 @@ class simics_memory_diff(Table):
         fields = ('checkpoint', 'image_index', 'block')
         model = models.simics_memory_diff
         template = 'django_tables2/bootstrap.html'
+
+
+class simics_memory_diff_range(Table):
+    class Meta:
+        fields = ('checkpoint', 'image_index', 'block', 'count')
+        model = models.simics_memory_diff_range
+        template = 'django_tables2/bootstrap.html'
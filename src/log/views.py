@@ -89,7 +89,7 @@ def campaign_page(request, campaign_id):
     RequestConfig(request, paginate=False).configure(campaign_table)
     RequestConfig(request, paginate=False).configure(event_table)
     return render(request, 'campaign.html', {
-        'campaign': campaign,
+        'campaign': campaign.assemble_output(),
         'campaign_items': campaign_items,
         'campaign_table': campaign_table,
         'chart_data': chart_data,
@@ -265,12 +265,14 @@ def results_page(request, campaign_id=None):
         else:
             results = result_filter.qs.order_by('-id')
     if request.method == 'GET' and 'view_output' in request.GET:
+        outputs = (result.assemble_output() for result
+                   in results.prefetch_related('output_chunk_set'))
         if 'view_dut_output' in request.GET:
             if 'view_download' in request.GET:
                 temp_file = TemporaryFile()
                 start = perf_counter()
                 with open_tar(fileobj=temp_file, mode='w:gz') as archive:
-                    for result in results:
+                    for result in outputs:
                         with BytesIO(result.dut_output.encode('utf-8')) as \
                                 byte_file:
                             info = TarInfo('{}_dut_output.txt'.format(
@@ -291,14 +293,14 @@ def results_page(request, campaign_id=None):
                     'campaign': campaign,
                     'campaign_items': campaign_items if campaign else None,
                     'navigation_items': navigation_items,
-                    'results': results,
+                    'results': outputs,
                     'type': 'dut_output'})
         elif 'view_aux_output' in request.GET:
             if 'view_download' in request.GET:
                 temp_file = TemporaryFile()
                 start = perf_counter()
                 with open_tar(fileobj=temp_file, mode='w:gz') as archive:
-                    for result in results:
+                    for result in outputs:
                         with BytesIO(result.aux_output.encode('utf-8')) as \
                                 byte_file:
                             info = TarInfo('{}_aux_output.txt'.format(
@@ -319,14 +321,14 @@ def results_page(request, campaign_id=None):
                     'campaign': campaign,
                     'campaign_items': campaign_items if campaign else None,
                     'navigation_items': navigation_items,
-                    'results': results,
+                    'results': outputs,
                     'type': 'aux_output'})
         elif 'view_debugger_output' in request.GET:
             if 'view_download' in request.GET:
                 temp_file = TemporaryFile()
                 start = perf_counter()
                 with open_tar(fileobj=temp_file, mode='w:gz') as archive:
-                    for result in results:
+                    for result in outputs:
                         with BytesIO(
                                 result.debugger_output.encode('utf-8')) as \
                                 byte_file:
@@ -348,7 +350,7 @@ def results_page(request, campaign_id=None):
                     'campaign': campaign,
                     'campaign_items': campaign_items if campaign else None,
                     'navigation_items': navigation_items,
-                    'results': results,
+                    'results': outputs,
                     'type': 'debugger_output'})
         elif 'view_output_file' in request.GET:
             result_ids = []
@@ -393,10 +395,13 @@ def results_page(request, campaign_id=None):
                 with open_tar(fileobj=temp_file, mode='w:gz') as archive:
                     for result in results:
                         for log_file in result.campaign.log_files:
-                            archive.add(
+                            log_file_path = \
                                 'campaign-data/{}/results/{}/{}'.format(
-                                    result.campaign_id, result.id, log_file),
-                                '{}_{}'.format(result.id, log_file))
+                                    result.campaign_id, result.id, log_file)
+                            # the files of the result may have been evicted
+                            if exists(log_file_path):
+                                archive.add(log_file_path, '{}_{}'.format(
+                                    result.id, log_file))
                 print('archive created', round(perf_counter()-start, 2),
                       'seconds')
                 response = FileResponse(
@@ -429,6 +434,8 @@ def results_page(request, campaign_id=None):
                         result.campaign_id, result.id)):
                     rmtree('campaign-data/{}/results/{}'.format(
                         result.campaign_id, result.id))
+            models.output_chunk.objects.filter(
+                result__in=results_to_delete).delete()
             results_to_delete.delete()
         elif 'delete_all' in request.POST:
             for result in results:
@@ -436,6 +443,7 @@ def results_page(request, campaign_id=None):
                         result.campaign_id, result.id)):
                     rmtree('campaign-data/{}/results/{}'.format(
                         result.campaign_id, result.id))
+            models.output_chunk.objects.filter(result__in=results).delete()
             results.delete()
             if campaign_id:
                 return redirect('/campaign/{}/results'.format(campaign_id))
@@ -461,7 +469,7 @@ def results_page(request, campaign_id=None):
 
 
 def result_page(request, result_id):
-    result = models.result.objects.get(id=result_id)
+    result = models.result.objects.get(id=result_id).assemble_output()
     if request.method == 'GET':
         if 'get_dut_output' in request.GET:
             response = HttpResponse(result.dut_output,
@@ -494,10 +502,12 @@ def result_page(request, result_id):
             temp_file = TemporaryFile()
             with open_tar(fileobj=temp_file, mode='w:gz') as archive:
                 for log_file in result.campaign.log_files:
-                    archive.add(
-                        'campaign-data/{}/results/{}/{}'.format(
-                            result.campaign_id, result.id, log_file),
-                        '{}_{}'.format(result.id, log_file))
+                    log_file_path = 'campaign-data/{}/results/{}/{}'.format(
+                        result.campaign_id, result.id, log_file)
+                    # the files of the result may have been evicted
+                    if exists(log_file_path):
+                        archive.add(log_file_path,
+                                    '{}_{}'.format(result.id, log_file))
             response = FileResponse(
                 temp_file, content_type='application/x-compressed')
             response['Content-Disposition'] = \
@@ -524,12 +534,13 @@ def result_page(request, result_id):
     if request.method == 'POST' and 'save' in request.POST:
         result.outcome = request.POST['outcome']
         result.outcome_category = request.POST['outcome_category']
-        result.save()
+        result.save(update_fields=['outcome', 'outcome_category'])
     elif request.method == 'POST' and 'delete' in request.POST:
         if exists('campaign-data/{}/results/{}'.format(
                 result.campaign_id, result.id)):
             rmtree('campaign-data/{}/results/{}'.format(
                 result.campaign_id, result.id))
+        result.output_chunk_set.all().delete()
         result.delete()
         return HttpResponse('Result deleted')
     injections = result.injection_set.all()
@@ -539,16 +550,33 @@ def result_page(request, result_id):
         else:
             injection_table = None
         register_diffs = result.simics_register_diff_set.all()
+        register_groups = result.simics_register_diff_group_set.all()
         register_filter = filters.simics_register_diff(
-            request.GET, queryset=register_diffs)
-        register_diff_count = register_filter.qs.count()
-        register_table = tables.simics_register_diff(register_filter.qs)
+            request.GET, queryset=register_diffs, groups=register_groups)
+        checkpoints = request.GET.getlist('checkpoint')
+        registers = request.GET.getlist('register')
+        register_diffs = list(register_filter.qs.values(
+            'checkpoint', 'config_object', 'register', 'gold_value',
+            'monitored_value'))
+        for group in register_groups:
+            if checkpoints and str(group.checkpoint) not in checkpoints:
+                continue
+            register_diffs.extend(
+                diff for diff in group.diffs()
+                if not registers or diff['register'] in registers)
+        register_diff_count = len(register_diffs)
+        register_table = tables.simics_register_diff(register_diffs)
         RequestConfig(
             request,
             paginate={'per_page': table_length}).configure(register_table)
-        memory_diffs = result.simics_memory_diff_set.all()
-        memory_diff_count = memory_diffs.count()
-        memory_table = tables.simics_memory_diff(memory_diffs)
+        memory_diffs = list(result.simics_memory_diff_range_set.values(
+            'checkpoint', 'image_index', 'block', 'count'))
+        memory_diffs.extend(
+            dict(diff, count=1) for diff in
+            result.simics_memory_diff_set.values(
+                'checkpoint', 'image_index', 'block'))
+        memory_diff_count = sum(diff['count'] for diff in memory_diffs)
+        memory_table = tables.simics_memory_diff_range(memory_diffs)
         RequestConfig(
             request,
             paginate={'per_page': table_length}).configure(memory_table)
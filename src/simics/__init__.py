@@ -18,11 +18,18 @@ OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER
 OF SUCH DAMAGE.
 """
 
+from ast import literal_eval
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from os import getcwd, kill, listdir, makedirs, mkdir
-from os.path import exists, join
-from random import choice
-from re import findall
+from fcntl import ioctl
+from hashlib import md5
+from numpy import (array, concatenate, cumsum, diff, frombuffer, int64,
+                   intersect1d, nonzero, searchsorted, setdiff1d, sort, uint8,
+                   union1d, zeros)
+from os import getcwd, kill, link, listdir, makedirs, remove, symlink
+from os.path import abspath, exists, join
+from random import choice, randrange
+from re import findall, MULTILINE
 from shutil import copyfile
 from signal import SIGINT, SIGKILL
 from subprocess import call, check_call, check_output, DEVNULL, PIPE, Popen
@@ -35,10 +42,30 @@ from ..dut import dut
 from ..error import DrSEUsError
 from ..targets import choose_injection, get_num_bits, get_targets
 from ..timeout import timeout, TimeoutException
-from .config import data_list, simics_config
+from .allocator import acquire_slot
+from .config import data_list, simics_config, SimicsConfigError
+from .merge import (lock_merged_checkpoint, merge_checkpoint,
+                    merge_gold_checkpoints)
+from .pipes import simics_pipes
+from .registers import (get_registers, register_digest, register_snapshot,
+                        save_register_snapshot)
+from .liveness import (first_accesses, load_liveness, save_liveness,
+                       traced_registers, written_bits)
+from .store import store_campaign
+
+# ioctl request to share the extents of a file (reflink) on Linux
+FICLONE = 0x40049409
 
 
 class simics(object):
+    # maximum number of RAM images compared at the same time
+    comparison_workers = 4
+    # Simics processes allowed at the same time unless --licenses is given
+    max_slots = 64
+    # first host port forwarded to SSH, each slot uses two (DUT and AUX)
+    ssh_port_base = 4022
+    # DUT memory reserved (at the top of RAM) for retrieving files on the host
+    staging_size = 16 << 20
     error_messages = ['Address not mapped', 'Illegal Instruction',
                       'Illegal instruction', 'Illegal memory mapping',
                       'Illegal Memory Mapping', 'Error setting attribute',
@@ -47,15 +74,23 @@ class simics(object):
 
     def __init__(self, database, options):
         self.simics = None
+        self.slot = self.slot_lock = None
+        self.pipes = None
         self.dut = None
         self.aux = None
         self.running = False
+        self.register_diffs = 0
+        self.gold_digests = {}
+        self.liveness = None
         self.db = database
         self.options = options
         if self.db.campaign.architecture == 'p2020':
             self.board = 'p2020rdb'
+            self.ram_images = ['DUT_p2020rdb.soc.ram_image[0]']
         elif self.db.campaign.architecture == 'a9':
             self.board = 'a9x2'
+            self.ram_images = ['DUT_a9x2.coretile.ddr_image[{}]'.format(index)
+                               for index in range(2)]
         self.set_targets(self.db.campaign.architecture)
 
     def __str__(self):
@@ -72,8 +107,19 @@ class simics(object):
             selected_registers = None
         self.targets = get_targets(architecture, 'simics', selected_targets,
                                    selected_registers, self.db.campaign.caches)
+        self.gold_targets = get_targets(architecture, 'simics', None, None,
+                                        self.db.campaign.caches)
 
-    def launch_simics(self, checkpoint=None):
+    def __start_simics(self):
+        """
+        Start a Simics process once a license slot is available. The slot also
+        selects the host ports used for SSH forwarding, so concurrent
+        processes never race for the same ports.
+        """
+        if self.slot is None:
+            self.slot, self.slot_lock = acquire_slot(
+                'simics-workspace/.slots',
+                getattr(self.options, 'licenses', None) or self.max_slots)
         cwd = '{}/simics-workspace'.format(getcwd())
         attempts = 10
         for attempt in range(attempts):
@@ -82,12 +128,17 @@ class simics(object):
                  '-stall' if self.db.campaign.caches else ''],
                 bufsize=0, cwd=cwd, universal_newlines=True,
                 stdin=PIPE, stdout=PIPE, stderr=PIPE)
+            self.pipes = simics_pipes(self.simics)
             try:
                 self.__command()
             except KeyboardInterrupt:
                 raise KeyboardInterrupt
             except Exception as error:
                 self.simics.kill()
+                if attempt == attempts-1:
+                    # the last attempt raises, so give up the license slot
+                    self.simics = None
+                    self.__release_slot()
                 self.__attempt_exception(
                     attempt, attempts, error, 'Error launching Simics',
                     'Error launching Simics, check your license connection')
@@ -95,6 +146,15 @@ class simics(object):
                 self.db.log_event(
                     'Information', 'Simics', 'Launched Simics')
                 break
+
+    def launch_simics(self, checkpoint=None):
+        if self.simics is None:
+            self.__start_simics()
+        else:
+            # reuse the running process (and its license) kept by close()
+            self.__command('restart-simics')
+            self.db.log_event(
+                'Information', 'Simics', 'Restarted Simics')
         # TODO: Simics fails down there if no license \/
         if self.db.campaign.caches:
                 self.__command('disable-multithreading')
@@ -118,12 +178,15 @@ class simics(object):
                                'mode = instruction-fetch-trace')
                 self.__command('DUT_p2020rdb.soc.cpu[1].instruction-fetch-mode '
                                'mode = instruction-fetch-trace')
+            ssh_port = self.ssh_port_base + 2*self.slot
             buff += self.__command('connect-real-network-port-in ssh '
-                                   'ethernet_switch0 target-ip=10.10.0.100')
+                                   'ethernet_switch0 target-ip=10.10.0.100 '
+                                   'host-port={}'.format(ssh_port))
             if self.db.campaign.aux:
                 buff += self.__command('connect-real-network-port-in ssh '
                                        'ethernet_switch0 '
-                                       'target-ip=10.10.0.104')
+                                       'target-ip=10.10.0.104 '
+                                       'host-port={}'.format(ssh_port+1))
         self.__command('enable-real-time-mode')
         found_settings = 0
         if checkpoint is None:
@@ -154,6 +217,13 @@ class simics(object):
         if self.board == 'p2020rdb':
             self.options.aux_prompt = self.options.dut_prompt = \
                 'root@p2020rdb:~#'
+            if checkpoint is None and \
+                    getattr(self.options, 'host_files', False):
+                # keep the kernel out of the staging area for __extract_file
+                memory = ' mem={}M'.format(
+                    (self.__ram_size() - self.staging_size) >> 20)
+            else:
+                memory = ''
             if self.options.dut_uboot:
                 self.options.dut_uboot += '; '
             self.options.dut_uboot += ('setenv ethaddr 00:01:af:07:9b:8a; '
@@ -161,8 +231,9 @@ class simics(object):
                                        'setenv eth2addr 00:01:af:07:9b:8c; '
                                        'setenv consoledev ttyS0; '
                                        'setenv bootargs root=/dev/ram rw '
-                                       'console=$consoledev,$baudrate; '
-                                       'bootm ef080000 10000000 ef040000')
+                                       'console=$consoledev,$baudrate{}; '
+                                       'bootm ef080000 10000000 '
+                                       'ef040000'.format(memory))
             if self.options.aux_uboot:
                 self.options.aux_uboot += '; '
             self.options.aux_uboot += ('setenv ethaddr 00:01:af:07:9b:8d; '
@@ -188,6 +259,10 @@ class simics(object):
         self.options.dut_ip_address = '10.10.0.100'
         self.options.dut_scp_port = ssh_ports[0]
         self.dut = dut(self.db, self.options)
+        self.staging_offset = None
+        if self.board == 'p2020rdb' and \
+                getattr(self.options, 'host_files', False):
+            self.dut.extract_file = self.__extract_file
         if self.db.campaign.aux:
             self.options.aux_serial_port = serial_ports[1]
             self.options.aux_ip_address = '10.10.0.104'
@@ -233,6 +308,64 @@ class simics(object):
                 if self.board == 'a9x2':
                     self.aux.prompt = 'DrSEUs# '
 
+    def __ram_size(self):
+        buff = self.__command(
+            '@print("DrSEUs:" + str(SIM_get_attribute(SIM_get_object("{}"), '
+            '"size")))'.format(self.ram_images[0]))
+        return int(findall(r'DrSEUs:(\d+)', buff)[0])
+
+    def __extract_file(self, file_, file_path):
+        """
+        Copies file_ on the DUT to the RAM reserved at boot (with mem=) using
+        /dev/mem and saves it from the RAM image on the host, which avoids the
+        simulated network stack and SSH. Returns False (and leaves retrieving
+        the file to SCP) if the campaign did not reserve the memory, the file
+        does not fit, or the checksum of the saved file does not match.
+        """
+        running = self.running
+        try:
+            if self.staging_offset is None:
+                match = findall(r'mem=(\d+)M',
+                                self.dut.command('cat /proc/cmdline')[0])
+                self.staging_offset = int(match[-1]) << 20 if match else 0
+            if not self.staging_offset:
+                return False
+            buff = self.dut.command('wc -c < {0}; md5sum {0}'.format(
+                file_))[0]
+            size = int(findall(r'^(\d+)\s*$', buff, MULTILINE)[0])
+            checksum = findall(r'([0-9a-f]{32})\s', buff)[0]
+            if size > self.staging_size:
+                return False
+            if size:
+                self.dut.command(
+                    'dd if={} of=/dev/mem bs=4096 seek={} conv=notrunc'.format(
+                        file_, self.staging_offset >> 12))
+                running = self.running
+                if running:
+                    self.halt_dut()
+                self.__command('{}.save "{}" {:#x} {}'.format(
+                    self.ram_images[0], abspath(file_path),
+                    self.staging_offset, size))
+                if running:
+                    self.continue_dut()
+            else:
+                open(file_path, 'wb').close()
+            with open(file_path, 'rb') as extracted_file:
+                if md5(extracted_file.read()).hexdigest() != checksum:
+                    raise Exception('checksum mismatch')
+        except KeyboardInterrupt:
+            raise KeyboardInterrupt
+        except Exception:
+            self.db.log_event(
+                'Warning', 'Simics', 'Error extracting file',
+                self.db.log_exception)
+            if running and not self.running:
+                self.continue_dut()
+            if exists(file_path):
+                remove(file_path)
+            return False
+        return True
+
     def launch_simics_gui(self, checkpoint):
         if self.board == 'p2020rdb':
             serial_port = 'serial[0]'
@@ -256,7 +389,32 @@ class simics(object):
         cwd = '{}/simics-workspace'.format(getcwd())
         call(['{}/simics-gui'.format(cwd), '-e', simics_commands], cwd=cwd)
 
-    def close(self):
+    def close(self, persistent=False):
+        """
+        Close Simics, or if persistent is true just halt it and disconnect from
+        the DUT so that the next launch_simics() can restart it in place
+        without starting a new process or checking out another license.
+        """
+        if self.simics and persistent and self.simics.poll() is None:
+            if self.dut:
+                self.dut.close()
+                self.dut = None
+            if self.aux:
+                self.aux.close()
+                self.aux = None
+            try:
+                self.halt_dut()
+            except DrSEUsError:
+                pass
+            else:
+                # the output of this iteration belongs to this result
+                buff = self.pipes.take_stderr()
+                if self.db.result:
+                    self.db.result.debugger_output += buff
+                else:
+                    self.db.campaign.debugger_output += buff
+                self.db.save()
+                return
         if self.simics:
             event = self.db.log_event('Information', 'Simics', 'Closed Simics',
                                       success=False)
@@ -271,11 +429,7 @@ class simics(object):
                 self.__command('quit')
             except DrSEUsError as error:
                 if error.type == 'Timeout reading from Simics':
-                    try:
-                        with timeout(30):
-                            buff = self.simics.stderr.read()
-                    except TimeoutException:
-                        buff = ''
+                    buff = self.pipes.take_stderr()
                     if self.db.result:
                         self.db.result.debugger_output += buff
                     else:
@@ -297,21 +451,29 @@ class simics(object):
                             self.db.log_exception)
                     self.simics.wait(5)
                     self.simics = None
+                    self.__release_slot()
             else:
+                self.simics.wait()
                 if self.db.result:
-                    self.db.result.debugger_output += self.simics.stderr.read()
+                    self.db.result.debugger_output += \
+                        self.pipes.take_stderr(timeout=30)
                 else:
                     self.db.campaign.debugger_output += \
-                        self.simics.stderr.read()
+                        self.pipes.take_stderr(timeout=30)
                 self.db.save()
-                self.simics.wait()
                 event.success = True
                 event.save()
                 self.simics = None
+                self.__release_slot()
         else:
             self.db.log_event('Warning', 'Simics', 'Closed Simics',
                               'Simics already closed', success=False)
 
+    def __release_slot(self):
+        if self.slot is not None:
+            self.slot_lock.close()
+            self.slot = self.slot_lock = None
+
     def halt_dut(self):
         if self.running:
             event = self.db.log_event('Information', 'Simics', 'Halt DUT',
@@ -345,31 +507,21 @@ class simics(object):
 
     def __command(self, command=None, timeout_=300):
 
+        def output(text):
+            if self.db.result is None:
+                self.db.campaign.debugger_output += text
+            else:
+                self.db.result.debugger_output += text
+            if self.options.debug:
+                print(colored(text, 'yellow'), end='')
+                stdout.flush()
+
         def read_until():
-            buff = ''
-            hanging = False
-            while True:
-                try:
-                    with timeout(timeout_):
-                        char = self.simics.stdout.read(1)
-                except TimeoutException:
-                    char = ''
-                    hanging = True
-                    self.db.log_event(
-                        'Error', 'Simics', 'Read timeout',
-                        self.db.log_exception)
-                if not char:
-                    break
-                if self.db.result is None:
-                    self.db.campaign.debugger_output += char
-                else:
-                    self.db.result.debugger_output += char
-                if self.options.debug:
-                    print(colored(char, 'yellow'), end='')
-                    stdout.flush()
-                buff += char
-                if buff.endswith('simics> '):
-                    break
+            buff, hanging = self.pipes.read_until('simics> ', timeout_, output)
+            if hanging:
+                self.db.log_event(
+                    'Error', 'Simics', 'Read timeout',
+                    'No output from Simics for {} seconds'.format(timeout_))
             if self.options.debug:
                 print()
             self.db.save()
@@ -414,16 +566,20 @@ class simics(object):
         else:
             raise DrSEUsError(error_type)
 
-    def __merge_checkpoint(self, checkpoint, attempts=10):
+    def __merge_checkpoint(self, checkpoint, attempts=10, lock=False):
+        """
+        Returns the merged checkpoint, and if lock is true also the open lock
+        file holding a shared lock that keeps it from being evicted.
+        """
         if self.options.debug:
             print(colored('merging checkpoint...', 'blue'), end='')
             stdout.flush()
-        merged_checkpoint = '{}_merged'.format(checkpoint)
-        cwd = '{}/simics-workspace'.format(getcwd())
         for attempt in range(attempts):
             try:
-                check_call(['{}/bin/checkpoint-merge'.format(cwd), checkpoint,
-                            merged_checkpoint], cwd=cwd, stdout=DEVNULL)
+                if lock:
+                    merged_checkpoint = lock_merged_checkpoint(checkpoint)
+                else:
+                    merged_checkpoint = merge_checkpoint(checkpoint)
             except KeyboardInterrupt:
                 raise KeyboardInterrupt
             except Exception as error:
@@ -436,6 +592,32 @@ class simics(object):
             print(colored('done', 'blue'))
         return merged_checkpoint
 
+    def __image_files(self, checkpoint):
+        """
+        Returns the files of the checkpoint chain that make up each RAM image
+        of the incremental checkpoint, or None if they cannot be resolved and
+        the checkpoint must be merged instead. The register values are read
+        from the incremental config directly since it contains every object.
+        """
+        try:
+            with simics_config('simics-workspace/{}'.format(checkpoint)) \
+                    as config:
+                image_files = [[abspath(file_)
+                                for file_ in config.image_files(image)]
+                               for image in self.ram_images]
+        except SimicsConfigError:
+            self.db.log_event(
+                'Warning', 'Simics', 'Error resolving image files',
+                self.db.log_exception)
+            return None
+        for files in image_files:
+            if not files or not all(exists(file_) for file_ in files):
+                self.db.log_event(
+                    'Warning', 'Simics', 'Error resolving image files',
+                    '\n'.join(files))
+                return None
+        return image_files
+
     def get_time(self):
         time_data = self.__command('print-time').split('\n')[-2].split()
         return int(time_data[2]), float(time_data[3])
@@ -465,10 +647,19 @@ class simics(object):
             read_thread = Thread(target=self.dut.read_until,
                                  kwargs={'flush': False})
             read_thread.start()
+            if self.options.liveness:
+                self.__command('new-tracer')
+                self.__command('trace0->trace_data = FALSE')
+                self.__command('trace0->trace_exceptions = FALSE')
             checkpoint = 1
             while True:
-                self.__command('run-cycles {}'.format(
-                    self.db.campaign.cycles_between), timeout_=300)
+                cycles = self.db.campaign.cycles_between
+                if self.options.liveness and checkpoint > 1:
+                    cycles -= self.__record_liveness(
+                        checkpoint-1, min(self.options.liveness, cycles))
+                if cycles:
+                    self.__command('run-cycles {}'.format(cycles),
+                                   timeout_=300)
                 old_length = length
                 length = len(self.db.campaign.dut_output)
                 if length - old_length:
@@ -487,11 +678,23 @@ class simics(object):
                     (self.db.campaign.aux and
                         self.db.campaign.kill_dut and
                         not aux_process.is_alive()):
-                    self.__merge_checkpoint(incremental_checkpoint)
                     break
                 else:
                     checkpoint += 1
             self.db.campaign.checkpoints = checkpoint
+            if self.options.liveness:
+                self.__command('delete-object trace0')
+                dead = len(load_liveness(
+                    'campaign-data/{}/liveness.json'.format(
+                        self.db.campaign.id)))
+                traced = (len(traced_registers[self.db.campaign.architecture]) *
+                          self.gold_targets['GPR'].get('count', 1) *
+                          checkpoint)
+                self.db.log_event(
+                    'Information', 'Simics', 'Recorded register liveness',
+                    '{} of {} traced (checkpoint, processor, register) are '
+                    'overwritten before they are read'.format(dead, traced),
+                    campaign=True)
             event.success = True
             event.timestamp = datetime.now()
             event.save()
@@ -509,14 +712,67 @@ class simics(object):
             self.__command(
                 'write-configuration gold-checkpoints/{}/1'.format(
                     self.db.campaign.id), timeout_=300)
+        freed = store_campaign(self.db.campaign.id)
+        if freed:
+            self.db.log_event(
+                'Information', 'Simics', 'Deduplicated gold checkpoints',
+                '{:.1f} MB freed'.format(freed / (1 << 20)), campaign=True)
+        self.__merge_gold_checkpoints()
+
+    def __record_liveness(self, checkpoint, cycles):
+        """
+        Trace the first cycles after gold checkpoint number checkpoint and save
+        which registers are overwritten before they are read, injections into
+        them are masked. Returns cycles.
+        """
+        trace_file = abspath('campaign-data/{}/liveness.trace'.format(
+            self.db.campaign.id))
+        self.__command('trace0.start "{}"'.format(trace_file))
+        self.__command('run-cycles {}'.format(cycles), timeout_=300)
+        self.__command('trace0.stop')
+        save_liveness('campaign-data/{}/liveness.json'.format(
+            self.db.campaign.id), checkpoint, first_accesses(
+                trace_file, self.db.campaign.architecture))
+        remove(trace_file)
+        return cycles
+
+    def __merge_gold_checkpoints(self):
+        """
+        Merge the last gold checkpoint, which every injection is compared to,
+        up front so that injection processes never have to merge it (or wait on
+        each other to). With merge_all every gold checkpoint is merged in
+        parallel, otherwise any other is merged on first use (or by the merge
+        command) when every checkpoint is compared or checked for convergence,
+        since a merged checkpoint holds a full copy of every RAM image.
+        """
+        if self.options.debug:
+            print(colored('merging gold checkpoints...', 'blue'), end='')
+            stdout.flush()
+        event = self.db.log_event(
+            'Information', 'Simics', 'Merged gold checkpoints', success=False,
+            campaign=True)
+        if self.options.merge_all:
+            merge_gold_checkpoints(self.db.campaign.id,
+                                   self.db.campaign.checkpoints)
+        else:
+            merge_checkpoint('gold-checkpoints/{}/{}'.format(
+                self.db.campaign.id, self.db.campaign.checkpoints))
+        event.success = True
+        event.timestamp = datetime.now()
+        event.save()
+        if self.options.debug:
+            print(colored('done', 'blue'))
 
     def inject_faults(self):
 
         def persistent_faults():
-            if self.db.result.simics_memory_diff_set.count() > 0:
+            if self.db.result.simics_memory_diff_range_set.exists():
                 return False
             injections = self.db.result.injection_set.all()
-            register_diffs = self.db.result.simics_register_diff_set.all()
+            register_diffs = [
+                diff for group in
+                self.db.result.simics_register_diff_group_set.all()
+                for diff in group.diffs()]
             for register_diff in register_diffs:
                 for injection in injections:
                     if injection.register_alias is None:
@@ -527,10 +783,10 @@ class simics(object):
                         injected_register = '{}:{}'.format(
                             injected_register,
                             ':'.join(map(str, injection.register_index)))
-                    if register_diff.config_object == \
+                    if register_diff['config_object'] == \
                         injection.config_object and \
-                            register_diff.register == injected_register:
-                        if (int(register_diff.monitored_value, base=0) ==
+                            register_diff['register'] == injected_register:
+                        if (int(register_diff['monitored_value'], base=0) ==
                                 int(injection.injected_value, base=0)):
                             break
                 else:
@@ -539,6 +795,7 @@ class simics(object):
                 return True
 
     # def inject_faults(self):
+        self.register_diffs = 0
         checkpoint_nums = list(range(1, self.db.campaign.checkpoints))
         checkpoints_to_inject = []
         for i in range(self.options.injections):
@@ -546,14 +803,42 @@ class simics(object):
             checkpoint_nums.remove(checkpoint_num)
             checkpoints_to_inject.append(checkpoint_num)
         checkpoints_to_inject = sorted(checkpoints_to_inject)
+        # cache data is not exposed as plain integers by the live objects
+        sub_checkpoint = self.options.sub_checkpoint and \
+            not self.db.campaign.caches
+        live = (self.options.live_injection or sub_checkpoint) and \
+            not self.db.campaign.caches
+        # cycles past each gold checkpoint to inject at, the simulation is
+        # fast-forwarded from the checkpoint in-session
+        offsets = {checkpoint: randrange(self.db.campaign.cycles_between)
+                   if sub_checkpoint else 0
+                   for checkpoint in checkpoints_to_inject}
         reg_errors = 0
         mem_errors = 0
         if checkpoints_to_inject:
             for injection_number, checkpoint in \
                     enumerate(checkpoints_to_inject, start=1):
-                injected_checkpoint, injection = \
-                    self.__inject_checkpoint(injection_number, checkpoint)
-                self.launch_simics(injected_checkpoint)
+                injection = self.__new_injection(checkpoint,
+                                                 offsets[checkpoint])
+                # liveness is only known at the gold checkpoints
+                if self.options.prune and self.options.injections == 1 and \
+                        not sub_checkpoint and \
+                        self.__prune_injection(injection):
+                    return 0, 0, False
+                # injections are only identical without cycle offsets
+                if self.options.memoize and self.options.injections == 1 and \
+                        not sub_checkpoint and self.__reuse_result(injection):
+                    makedirs('simics-workspace/injected-checkpoints/{}/{}'
+                             ''.format(self.db.campaign.id, self.db.result.id),
+                             exist_ok=True)
+                    return (self.db.result.num_register_diffs,
+                            self.db.result.num_memory_diffs,
+                            self.db.result.outcome == 'Persistent faults')
+                if live:
+                    self.__inject_live(injection_number, checkpoint, injection)
+                else:
+                    self.launch_simics(self.__inject_checkpoint(
+                        injection_number, checkpoint, injection))
                 injection.time = self.get_time()[1]-self.db.campaign.start_time
                 injection.save()
                 injections_remaining = \
@@ -562,37 +847,54 @@ class simics(object):
                     next_checkpoint = checkpoints_to_inject[injection_number]
                 else:
                     next_checkpoint = self.db.campaign.checkpoints
-                reg_errors_, mem_errors_ = \
-                    self.__compare_checkpoints(checkpoint, next_checkpoint)
+                reg_errors_, mem_errors_, converged = \
+                    self.__compare_checkpoints(checkpoint, next_checkpoint,
+                                               injection.offset)
                 if reg_errors_ > reg_errors:
                     reg_errors = reg_errors_
                 if mem_errors_ > mem_errors:
                     mem_errors = mem_errors_
                 if injections_remaining:
-                    self.close()
+                    if not live:
+                        self.close(self.options.persistent_simics)
+                elif converged:
+                    # diffs at earlier checkpoints are still latent faults
+                    self.__log_no_error(
+                        'Latent faults' if reg_errors or mem_errors
+                        else 'Masked faults')
                 else:
+                    if self.options.max_speed:
+                        self.__command('enable-real-time-mode')
                     self.continue_dut()
         else:
-            self.close()
+            self.close(self.options.persistent_simics)
             makedirs('simics-workspace/injected-checkpoints/{}/{}'.format(
-                self.db.campaign.id, self.db.result.id))
+                self.db.campaign.id, self.db.result.id), exist_ok=True)
             self.launch_simics('gold-checkpoints/{}/1'.format(
                 self.db.campaign.id))
-            reg_errors, mem_errors = \
+            reg_errors, mem_errors, converged = \
                 self.__compare_checkpoints(1, self.db.campaign.checkpoints)
+            if self.options.max_speed and not converged:
+                self.__command('enable-real-time-mode')
+        if converged:
+            return reg_errors, mem_errors, False
         return reg_errors, mem_errors, (reg_errors and persistent_faults())
 
     def regenerate_checkpoints(self, injections):
         self.db.result.id = self.options.result_id
         for injection_number, injection in enumerate(injections, start=1):
             injected_checkpoint = self.__inject_checkpoint(
-                injection_number, injection.checkpoint, injection)[0]
+                injection_number, injection.checkpoint, injection,
+                regenerate=True)
             if injection_number < len(injections):
                 self.launch_simics(checkpoint=injected_checkpoint)
+                # the injected checkpoint is offset cycles past the checkpoint
+                offset = injection.offset or 0
                 for j in range(injection.checkpoint,
                                injections[injection_number].checkpoint):
                     self.__command('run-cycles {}'.format(
-                        self.db.campaign.cycles_between), timeout_=300)
+                        self.db.campaign.cycles_between-offset), timeout_=300)
+                    offset = 0
                 self.__command(
                     'write-configuration injected-checkpoints/{}/{}/{}'.format(
                         self.db.campaign.id, self.options.result_id,
@@ -600,26 +902,178 @@ class simics(object):
                 self.close()
         return injected_checkpoint
 
-    def __inject_checkpoint(self, injection_number, checkpoint, injection=None):
+    def __gold_registers(self, checkpoint, gold_checkpoint):
+        """
+        Returns the register snapshot of gold checkpoint number checkpoint,
+        extracting it from gold_checkpoint the first time it is used. The
+        snapshot includes every target of the campaign so it can be shared by
+        injections that select different targets.
+        """
+        snapshot = 'campaign-data/{}/gold-registers/{}'.format(
+            self.db.campaign.id, checkpoint)
+        if not exists(snapshot):
+            with simics_config('simics-workspace/{}'.format(
+                    gold_checkpoint)) as config:
+                save_register_snapshot(snapshot, get_registers(
+                    config, self.gold_targets, self.board))
+        return register_snapshot(snapshot)
 
-        def inject_config(injected_checkpoint, injection):
+    def __materialize_checkpoint(self, gold_checkpoint, injected_checkpoint):
+        """
+        Create injected_checkpoint from the files of gold_checkpoint. Only the
+        config is modified by injections, so the other files (including the
+        RAM images) are hard linked, or reflinked if hard links are not
+        supported, or symbolically linked if the injected checkpoint is on
+        another filesystem, and only copied as a last resort.
+        """
+        makedirs(injected_checkpoint)
+        for checkpoint_file in listdir(gold_checkpoint):
+            gold_file = join(gold_checkpoint, checkpoint_file)
+            injected_file = join(injected_checkpoint, checkpoint_file)
+            # the config is rewritten in place, so it must not share an inode
+            # with the gold checkpoint
+            if checkpoint_file != 'config':
+                try:
+                    link(gold_file, injected_file)
+                except OSError:
+                    pass
+                else:
+                    continue
+                try:
+                    with open(gold_file, 'rb') as gold, \
+                            open(injected_file, 'wb') as injected:
+                        ioctl(injected.fileno(), FICLONE, gold.fileno())
+                except OSError:
+                    pass
+                else:
+                    continue
+                # injected checkpoints staged on a RAM disk are on a different
+                # filesystem than the gold checkpoint
+                if exists(injected_file):
+                    remove(injected_file)
+                try:
+                    symlink(abspath(gold_file), injected_file)
+                except OSError:
+                    pass
+                else:
+                    continue
+            copyfile(gold_file, injected_file)
+
+    def __new_injection(self, checkpoint, offset=0):
+        injection = choose_injection(self.targets,
+                                     self.options.selected_target_indices)
+        injection = self.db.result.injection_set.create(
+            checkpoint=checkpoint, offset=offset, success=False, **injection)
+        target = self.targets[injection.target]
+        if 'type' in target and target['type'] == 'gcache':
+            injection.config_object = self.targets[injection.target]['object']
+        else:
+            injection.config_object = 'DUT_{}.{}'.format(
+                self.board, self.targets[injection.target]['object'])
+        if injection.target_index is not None:
+            injection.config_object += '[{}]'.format(injection.target_index)
+        injection.save()
+        return injection
 
-            def flip_bit(value, bit):
-                num_bits = get_num_bits(
-                    injection.field, injection.register, injection.target,
-                    self.targets)
-                if bit >= num_bits or bit < 0:
-                    raise Exception('invalid bit: {} for num_bits: {}'.format(
-                        bit, num_bits))
-                value = int(value, base=0)
-                binary_list = list(bin(value)[2:].zfill(num_bits))
-                binary_list[num_bits-1-bit] = (
-                    '1' if binary_list[num_bits-1-bit] == '0' else '0')
-                injected_value = int(''.join(binary_list), 2)
-                injected_value = hex(injected_value).rstrip('L')
-                return injected_value
-
-        # def inject_config(injected_checkpoint, injection):
+    def __prune_injection(self, injection):
+        """
+        Logs the result of an injection into a bit of a register that is
+        overwritten before it is read (according to the liveness recorded with
+        the gold run) as masked without simulating it and returns True if so.
+        Only the bits written by the traced instructions are pruned. Pruned
+        injections are still chosen uniformly, so the outcome rates remain
+        those of the full fault space.
+        """
+        if self.liveness is None:
+            self.liveness = load_liveness('campaign-data/{}/liveness.json'
+                                          ''.format(self.db.campaign.id))
+        if injection.target != 'GPR' or \
+                injection.bit >= written_bits[
+                    self.db.campaign.architecture] or \
+                (injection.checkpoint, injection.target_index or 0,
+                 injection.register) not in self.liveness:
+            return False
+        injection.success = True
+        injection.save()
+        self.__log_no_error('Masked faults')
+        self.db.log_event(
+            'Information', 'Simics', 'Pruned injection',
+            '{} is overwritten before it is read after checkpoint {}'.format(
+                injection.register, injection.checkpoint))
+        return True
+
+    def __log_no_error(self, outcome):
+        """
+        Sets the outcome of a result that is known to match the gold run at
+        the end of the workload without simulating it, so it has the cycles,
+        execution time, and output of the gold run.
+        """
+        self.db.result.outcome_category = 'No error'
+        self.db.result.outcome = outcome
+        self.db.result.cycles = self.db.campaign.cycles
+        self.db.result.execution_time = self.db.campaign.execution_time
+        if self.db.campaign.output_file:
+            self.db.result.data_diff = 1.0
+
+    def __reuse_result(self, injection):
+        """
+        Reuses the outcome of a previous result with the same injection if
+        there is one and returns True if so.
+        """
+        previous_result = self.db.get_reusable_result(injection)
+        if previous_result is None:
+            return False
+        previous_injection = previous_result.injection_set.get()
+        injection.gold_value = previous_injection.gold_value
+        injection.injected_value = previous_injection.injected_value
+        injection.time = previous_injection.time
+        injection.success = True
+        injection.save()
+        self.db.reuse_result(previous_result)
+        return True
+
+    def __flip_bit(self, injection, value):
+        num_bits = get_num_bits(
+            injection.field, injection.register, injection.target,
+            self.targets)
+        bit = injection.bit
+        if bit >= num_bits or bit < 0:
+            raise Exception('invalid bit: {} for num_bits: {}'.format(
+                bit, num_bits))
+        value = int(value, base=0)
+        binary_list = list(bin(value)[2:].zfill(num_bits))
+        binary_list[num_bits-1-bit] = (
+            '1' if binary_list[num_bits-1-bit] == '0' else '0')
+        injected_value = int(''.join(binary_list), 2)
+        injected_value = hex(injected_value).rstrip('L')
+        return injected_value
+
+    def __log_injection(self, injection):
+        injection.success = True
+        injection.save()
+        self.db.log_event(
+            'Information', 'Simics', 'Fault injected')
+        if self.options.debug:
+            print(colored(
+                'result id: {}\ncheckpoint number: {}\ntarget: {}\n'
+                'register: {}\nfield: {}\nbit: {}\ngold value: {}\n'
+                'injected value: {}'.format(
+                    self.db.result.id, injection.checkpoint,
+                    injection.target_name, injection.register, injection.field,
+                    injection.bit, injection.gold_value,
+                    injection.injected_value),
+                'magenta'))
+            if injection.register_index is not None:
+                print(colored('register index: {}'.format(
+                    injection.register_index), 'magenta'))
+            if injection.offset:
+                print(colored('cycle offset: {}'.format(injection.offset),
+                              'magenta'))
+
+    def __inject_checkpoint(self, injection_number, checkpoint, injection,
+                            regenerate=False):
+
+        def inject_config(injected_checkpoint, injection):
             with simics_config(injected_checkpoint) as config:
                 config_object = injection.config_object
                 if injection.register_alias is None:
@@ -631,7 +1085,8 @@ class simics(object):
                     raise Exception('error getting register value from config')
                 if injection.register_index is None:
                     if not injection.injected_value:
-                        injected_value = flip_bit(gold_value, injection.bit)
+                        injected_value = self.__flip_bit(injection,
+                                                         gold_value)
                     else:
                         injected_value = injection.injected_value
                     config.set(config_object, register, injected_value)
@@ -657,7 +1112,8 @@ class simics(object):
                                 gold_value = '0x'+gold_value[1:-1]
                             else:
                                 raise Exception('got unexpected cache data')
-                        injected_value = flip_bit(gold_value, injection.bit)
+                        injected_value = self.__flip_bit(injection,
+                                                         gold_value)
                         if cache_data:
                             bits = int(get_num_bits(
                                 injection.field, injection.register,
@@ -680,8 +1136,8 @@ class simics(object):
                 config.save()
             return gold_value, injected_value
 
-    # def __inject_checkpoint(self, injection_number, checkpoint,
-    #                         injection=None):
+    # def __inject_checkpoint(self, injection_number, checkpoint, injection,
+    #                         regenerate=False):
         if injection_number == 1:
             gold_checkpoint = 'simics-workspace/gold-checkpoints/{}/{}'.format(
                 self.db.campaign.id, checkpoint)
@@ -689,29 +1145,27 @@ class simics(object):
             gold_checkpoint = \
                 'simics-workspace/injected-checkpoints/{}/{}/{}'.format(
                     self.db.campaign.id, self.db.result.id, checkpoint)
+        if regenerate and injection.offset:
+            # the fault was injected in-session after fast-forwarding
+            fast_forwarded_checkpoint = \
+                'injected-checkpoints/{}/{}/{}_fast-forwarded'.format(
+                    self.db.campaign.id, self.db.result.id, checkpoint)
+            self.launch_simics(
+                gold_checkpoint.replace('simics-workspace/', ''))
+            self.__command('run-cycles {}'.format(injection.offset),
+                           timeout_=300)
+            self.__command('write-configuration {}'.format(
+                fast_forwarded_checkpoint), timeout_=300)
+            self.close()
+            gold_checkpoint = 'simics-workspace/{}'.format(
+                fast_forwarded_checkpoint)
         injected_checkpoint = \
             'simics-workspace/injected-checkpoints/{}/{}/{}_injected'.format(
                 self.db.campaign.id, self.db.result.id, checkpoint)
-        makedirs(injected_checkpoint)
-        checkpoint_files = listdir(gold_checkpoint)
-        for checkpoint_file in checkpoint_files:
-            copyfile(join(gold_checkpoint, checkpoint_file),
-                     join(injected_checkpoint, checkpoint_file))
-        if injection is None:
-            injection = choose_injection(self.targets,
-                                         self.options.selected_target_indices)
-            injection = self.db.result.injection_set.create(
-                checkpoint=checkpoint, success=False, **injection)
-            target = self.targets[injection.target]
-            if 'type' in target and target['type'] == 'gcache':
-                injection.config_object = \
-                    self.targets[injection.target]['object']
-            else:
-                injection.config_object = 'DUT_{}.{}'.format(
-                    self.board, self.targets[injection.target]['object'])
-            if injection.target_index is not None:
-                injection.config_object += '[{}]'.format(injection.target_index)
-            injection.save()
+        self.__materialize_checkpoint(gold_checkpoint, injected_checkpoint)
+        if regenerate:
+            inject_config(injected_checkpoint, injection)
+        else:
             try:
                 injection.gold_value, injection.injected_value = \
                     inject_config(injected_checkpoint, injection)
@@ -722,147 +1176,145 @@ class simics(object):
                     'Error', 'Simics', 'Error injecting fault',
                     self.db.log_exception)
                 raise DrSEUsError('Error injecting fault')
-            else:
-                injection.success = True
-                injection.save()
+            self.__log_injection(injection)
+        return injected_checkpoint.replace('simics-workspace/', '')
+
+    def __inject_live(self, injection_number, checkpoint, injection):
+        """
+        Injects a fault by setting the register attribute of the live object
+        through the embedded Python of Simics. The first injection loads the
+        gold checkpoint, later injections are made where the simulation of the
+        previous one stopped. The simulation is then run the offset of the
+        injection in cycles past the checkpoint before injecting. The gold and
+        injected values are read back from the object.
+        """
+
+        def get_attribute(config_object, register):
+            buff = self.__command(
+                '@print("DrSEUs:" + repr(SIM_get_attribute('
+                'SIM_get_object("{}"), "{}")))'.format(config_object,
+                                                       register))
+            value = literal_eval(findall(r'DrSEUs:(.*)', buff)[0])
+            for index in injection.register_index or []:
+                value = value[index]
+            return hex(value)
+
+    # def __inject_live(self, injection_number, checkpoint, injection):
+        if injection_number == 1:
+            makedirs('simics-workspace/injected-checkpoints/{}/{}'.format(
+                self.db.campaign.id, self.db.result.id), exist_ok=True)
+            self.launch_simics('gold-checkpoints/{}/{}'.format(
+                self.db.campaign.id, checkpoint))
+        if injection.offset:
+            if self.options.max_speed:
+                # nothing interacts with the DUT while fast-forwarding
+                self.__command('disable-real-time-mode')
+            self.running = True
+            try:
+                self.__command('run-cycles {}'.format(injection.offset),
+                               timeout_=1200 if self.db.campaign.caches
+                               else 300)
+            except DrSEUsError as error:
                 self.db.log_event(
-                    'Information', 'Simics', 'Fault injected')
-            if self.options.debug:
-                print(colored(
-                    'result id: {}\ncheckpoint number: {}\ntarget: {}\n'
-                    'register: {}\nfield: {}\nbit: {}\ngold value: {}\n'
-                    'injected value: {}'.format(
-                        self.db.result.id, checkpoint,  injection.target_name,
-                        injection.register, injection.field, injection.bit,
-                        injection.gold_value, injection.injected_value),
-                    'magenta'))
-                if injection.register_index is not None:
-                    print(colored('register index: {}'.format(
-                        injection.register_index), 'magenta'))
+                    'Error', 'Simics', error.type, self.db.log_exception)
+                raise DrSEUsError('Error continuing simulation')
+            else:
+                self.running = False
+            self.db.log_event(
+                'Information', 'Simics', 'Fast-forwarded',
+                '{} cycles past checkpoint {}'.format(injection.offset,
+                                                      checkpoint))
+        if injection.register_alias is None:
+            register = injection.register
         else:
-            inject_config(injected_checkpoint, injection)
-        return injected_checkpoint.replace('simics-workspace/', ''), injection
+            register = injection.register_alias
+        try:
+            injection.gold_value = get_attribute(injection.config_object,
+                                                 register)
+            injected_value = self.__flip_bit(injection, injection.gold_value)
+            # attribute lists are copied on get, so the whole value is set
+            self.__command(
+                '@obj = SIM_get_object("{0}"); '
+                'value = SIM_get_attribute(obj, "{1}"); value{2} = {3}; '
+                'SIM_set_attribute(obj, "{1}", value)'.format(
+                    injection.config_object, register,
+                    ''.join('[{}]'.format(index) for index
+                            in injection.register_index or []),
+                    injected_value))
+            injection.injected_value = get_attribute(injection.config_object,
+                                                     register)
+        except KeyboardInterrupt:
+            raise KeyboardInterrupt
+        except Exception:
+            self.db.log_event(
+                'Error', 'Simics', 'Error injecting fault',
+                self.db.log_exception)
+            raise DrSEUsError('Error injecting fault')
+        self.__log_injection(injection)
 
-    def __compare_checkpoints(self, checkpoint, last_checkpoint):
+    def __compare_checkpoints(self, checkpoint, last_checkpoint, offset=0):
 
         def compare_registers(checkpoint, gold_checkpoint,
                               monitored_checkpoint):
             """
             Compares the register values of the checkpoint for iteration
-            to the gold_checkpoint and adds the differences to the database.
+            to the gold register snapshot of the checkpoint and adds the
+            differences to the database.
             """
+            gold_registers = self.__gold_registers(checkpoint, gold_checkpoint)
+            with simics_config('simics-workspace/{}'.format(
+                    monitored_checkpoint)) as config:
+                monitored_registers = get_registers(config, self.targets,
+                                                    self.board)
+            diffs, missing = gold_registers.diff(monitored_registers)
+            for config_object, register in missing:
+                self.db.log_event(
+                    'DEBUG', 'DrSEUs', 'IndexError',
+                    'config object: {}\nregister: {}'.format(
+                        config_object, register))
+            self.db.log_register_diffs(checkpoint, diffs)
+            self.register_diffs += len(diffs)
+            return self.register_diffs
 
-            def get_registers(checkpoint):
-                """
-                Retrieves all the register values of the targets specified in
-                simics_targets.py for the specified checkpoint and returns a
-                dictionary with all the values.
-                """
-                with simics_config('simics-workspace/{}'.format(checkpoint)) \
-                        as config:
-                    registers = {}
-                    for target in self.targets:
-                        if 'count' in self.targets[target]:
-                            count = self.targets[target]['count']
-                        else:
-                            count = 1
-                        for target_index in range(count):
-                            if 'type' in self.targets[target] and \
-                                    self.targets[target]['type'] == 'gcache':
-                                config_object = self.targets[target]['object']
-                            else:
-                                config_object = 'DUT_{}.{}'.format(
-                                    self.board, self.targets[target]['object'])
-                            if count > 1:
-                                config_object += '[{}]'.format(target_index)
-                            if config_object not in registers:
-                                registers[config_object] = {}
-                            for register in self.targets[target]['registers']:
-                                if 'alias' in (self.targets[target]['registers']
-                                                           [register]):
-                                    register = \
-                                        (self.targets[target]['registers']
-                                                     [register]['alias']
-                                                     ['register'])
-                                if register not in registers[config_object]:
-                                    registers[config_object][register] = \
-                                        config.get(config_object, register)
-                return registers
-
-            # watch out! we're gonna use recursion
-            # keep your arms and legs inside the stack frame at all times
-            def log_diffs(config_object, register, gold_value, monitored_value):
-                if isinstance(gold_value, data_list):
-                    gold_value = '0x'+gold_value[0]
-                elif isinstance(gold_value, str) and gold_value[0] == '[' \
-                        and gold_value[-1] == ']':
-                    # for some reason we might get
-                    # string '[000...000]' instead of a data_list
-                    gold_value = '0x'+gold_value[1:-1]
-                elif isinstance(gold_value, list):
-                    for index in range(len(gold_value)):
-                        try:
-                            log_diffs(
-                                config_object, '{}:{}'.format(register, index),
-                                gold_value[index], monitored_value[index])
-                        except IndexError:  # TODO: remove this debug statement
-                            self.db.log_event(
-                                'DEBUG', 'DrSEUs', 'IndexError',
-                                'config object: {}\nregister: {}:{}\n gold: {}'
-                                '\nmonitored: {}'.format(
-                                    config_object, register, index, gold_value,
-                                    monitored_value))
-                else:
-                    if int(monitored_value, base=0) != int(gold_value, base=0):
-                        self.db.log_diff(checkpoint, config_object, register,
-                                         gold_value, monitored_value)
-
-        # def compare_registers(checkpoint, gold_checkpoint,
-        #                       monitored_checkpoint):
-            # import pprint
-            gold_registers = get_registers(gold_checkpoint)
-            # with open('gold_regs.txt', 'w') as gold_out:
-            #     pp = pprint.PrettyPrinter(indent=4, stream=gold_out)
-            #     pp.pprint(gold_registers)
-            monitored_registers = get_registers(monitored_checkpoint)
-            # with open('mon_regs.txt', 'w') as mon_out:
-            #     pp = pprint.PrettyPrinter(indent=4, stream=mon_out)
-            #     pp.pprint(monitored_registers)
-            for config_object in gold_registers:
-                for register in gold_registers[config_object]:
-                    log_diffs(
-                        config_object, register,
-                        gold_registers[config_object][register],
-                        monitored_registers[config_object][register])
-                diffs = self.db.result.simics_register_diff_set.count()
-            return diffs
-
-        def compare_memory(checkpoint, gold_checkpoint, monitored_checkpoint):
+        def compare_memory(gold_checkpoint, monitored_checkpoint, image_files,
+                           executor):
             """
             Compare the memory contents of gold_checkpoint with
-            monitored_checkpoint and return the list of blocks that do not
-            match. If extract_blocks is true then extract any blocks that do not
-            match to incremental_checkpoint/memory-blocks/.
+            monitored_checkpoint and return a future for each RAM image that
+            results in the list of blocks that do not match. The images are
+            compared concurrently using executor. If image_files is not None
+            the monitored images are compared file by file to the files of the
+            checkpoint chain it lists for each image. If extract_blocks is true
+            then extract any blocks that do not match to
+            monitored_checkpoint/memory-blocks/.
             """
 
             def parse_content_map(content_map, block_size):
                 """
                 Parse a content_map created by the Simics craff utility and
-                returns a list of the addresses of the image that contain data.
+                returns an array of the addresses of the image that contain
+                data. The block maps of all lines are joined and searched for
+                "D" at once instead of character by character.
                 """
-                with open('simics-workspace/{}'.format(content_map), 'r') \
+                bases = []
+                lengths = []
+                maps = []
+                with open('simics-workspace/{}'.format(content_map), 'rb') \
                         as content_map:
-                    diff_addresses = []
                     for line in content_map:
-                        if 'empty' not in line:
+                        if b'empty' not in line:
                             line = line.split()
-                            base_address = int(line[0], 16)
-                            offsets = [index for index, value
-                                       in enumerate(line[1]) if value == 'D']
-                            for offset in offsets:
-                                diff_addresses.append(base_address +
-                                                      offset*block_size)
-                return diff_addresses
+                            bases.append(int(line[0], 16))
+                            lengths.append(len(line[1]))
+                            maps.append(line[1])
+                if not maps:
+                    return zeros(0, dtype=int64)
+                lengths = array(lengths, dtype=int64)
+                blocks = nonzero(frombuffer(b''.join(maps), dtype=uint8) ==
+                                 ord('D'))[0]
+                lines = searchsorted(cumsum(lengths), blocks, side='right')
+                offsets = blocks - (cumsum(lengths) - lengths)[lines]
+                return array(bases, dtype=int64)[lines] + offsets*block_size
 
             def extract_diff_blocks(gold_ram, monitored_ram,
                                     incremental_checkpoint, addresses,
@@ -870,79 +1322,211 @@ class simics(object):
                 """
                 Extract all of the blocks of size block_size specified in
                 addresses of both the gold_ram image and the monitored_ram
-                image.
+                image. The image is split into windows of max_window blocks
+                and the span of the blocks in each window is extracted with a
+                single craff invocation per image (whether or not the blocks
+                are contiguous) and then split into a file per block, so
+                scattered blocks do not need an invocation each.
                 """
+                max_window = 1024
                 if len(addresses) > 0:
-                    mkdir('{}/memory-blocks'.format(incremental_checkpoint))
-                    for address in addresses:
-                        check_call([craff, gold_ram,
-                                    '--extract={:#x}'.format(address),
-                                    '--extract-block-size={}'.format(
-                                        block_size),
-                                    '--output={}/memory-blocks/{:#x}_gold.raw'
-                                    ''.format(incremental_checkpoint, address)],
-                                   cwd=cwd)
-                        check_call([craff,  monitored_ram,
-                                    '--extract={:#x}'.format(address),
-                                    '--extract-block-size={}'.format(
-                                        block_size),
-                                    '--output={}/memory-blocks/{:#x}_monitored'
-                                    '.raw'.format(incremental_checkpoint,
-                                                  address)],
-                                   cwd=cwd)
-
-        # def compare_memory(checkpoint, gold_checkpoint, monitored_checkpoint):
-            if self.board == 'p2020rdb':
-                gold_rams = ['{}/DUT_{}.soc.ram_image[0].craff'.format(
-                    gold_checkpoint, self.board)]
-                monitored_rams = ['{}/DUT_{}.soc.ram_image[0].craff'.format(
-                    monitored_checkpoint, self.board)]
-            elif self.board == 'a9x2':
-                gold_rams = ['{}/DUT_{}.coretile.ddr_image[{}].craff'.format(
-                    gold_checkpoint, self.board, index) for index in range(2)]
-                monitored_rams = [
-                    '{}/DUT_{}.coretile.ddr_image[{}].craff'.format(
-                        monitored_checkpoint, self.board, index)
-                    for index in range(2)]
-            ram_diffs = ['{}.diff'.format(ram) for ram in monitored_rams]
-            diff_content_maps = ['{}.content_map'.format(diff)
-                                 for diff in ram_diffs]
-            diffs = 0
-            cwd = '{}/simics-workspace'.format(getcwd())
-            craff = '{}/bin/craff'.format(cwd)
-            for (image_index, gold_ram, monitored_ram, ram_diff,
-                    diff_content_map) in zip(
-                        range(len(monitored_rams)), gold_rams, monitored_rams,
-                        ram_diffs, diff_content_maps):
-                check_call([craff, '--diff', gold_ram, monitored_ram,
-                            '--output={}'.format(ram_diff)],
-                           cwd=cwd, stdout=DEVNULL)
-                check_call([craff, '--content-map', ram_diff,
-                            '--output={}'.format(diff_content_map)],
+                    directory = '{}/memory-blocks'.format(
+                        incremental_checkpoint)
+                    makedirs('simics-workspace/{}'.format(directory),
+                             exist_ok=True)
+                    addresses = array(addresses, dtype=int64)
+                    windows = (addresses - addresses[0]) // \
+                        (max_window*block_size)
+                    starts = concatenate((
+                        [0], nonzero(diff(windows))[0] + 1))
+                    ends = concatenate((starts[1:], [len(addresses)]))
+                    for start, end in zip(starts, ends):
+                        first = addresses[start]
+                        span = addresses[end-1] - first + block_size
+                        for ram, name in ((gold_ram, 'gold'),
+                                          (monitored_ram, 'monitored')):
+                            run_file = '{}/{:#x}_{}.run'.format(
+                                directory, first, name)
+                            check_call([craff, ram,
+                                        '--extract={:#x}'.format(first),
+                                        '--extract-block-size={}'.format(
+                                            span),
+                                        '--output={}'.format(run_file)],
+                                       cwd=cwd)
+                            with open('simics-workspace/{}'.format(
+                                    run_file), 'rb') as run_data:
+                                data = run_data.read()
+                            remove('simics-workspace/{}'.format(run_file))
+                            for address in addresses[start:end]:
+                                offset = address - first
+                                with open('simics-workspace/{}/{:#x}_{}'
+                                          '.raw'.format(directory, address,
+                                                        name),
+                                          'wb') as block_data:
+                                    block_data.write(
+                                        data[offset:offset+block_size])
+
+            def content_blocks(image, content_map):
+                """
+                Returns the addresses of the blocks of image that contain data
+                and its block size, the content map is written to
+                content_map.
+                """
+                check_call([craff, '--content-map', image,
+                            '--output={}'.format(content_map)],
                            cwd=cwd, stdout=DEVNULL)
-                craff_output = check_output([craff, '--info', ram_diff],
+                craff_output = check_output([craff, '--info', image],
                                             cwd=cwd,
                                             universal_newlines=True)
                 block_size = int(findall(r'\d+',
                                          craff_output.split('\n')[2])[1])
-                changed_blocks = parse_content_map(diff_content_map,
-                                                   block_size)
-                diffs += len(changed_blocks)
+                return parse_content_map(content_map, block_size), block_size
+
+            def compare_chain(gold_ram, monitored_ram, monitored_files):
+                """
+                Compares gold_ram to each file of the checkpoint chain of the
+                monitored image, from the last (which takes precedence) to the
+                first, keeping only the changed blocks the file holds that no
+                later file overrides. Blocks that hold data in gold_ram and
+                are in no file of the chain are changed as well. Returns the
+                changed blocks with the file each is read from, so the chain is
+                never merged into a full image.
+                """
+                covered = zeros(0, dtype=int64)
+                file_blocks = []
+                for index in reversed(range(len(monitored_files))):
+                    monitored_file = monitored_files[index]
+                    file_diff = '{}.{}.diff'.format(monitored_ram, index)
+                    present, block_size = content_blocks(
+                        monitored_file, '{}.{}.content_map'.format(
+                            monitored_ram, index))
+                    present = setdiff1d(present, covered)
+                    check_call([craff, '--diff', gold_ram, monitored_file,
+                                '--output={}'.format(file_diff)],
+                               cwd=cwd, stdout=DEVNULL)
+                    diff_blocks, block_size = content_blocks(
+                        file_diff, '{}.content_map'.format(file_diff))
+                    file_blocks.append((monitored_file,
+                                        intersect1d(diff_blocks, present)))
+                    covered = union1d(covered, present)
+                gold_blocks, _ = content_blocks(
+                    gold_ram, '{}.gold.content_map'.format(monitored_ram))
+                file_blocks.append((monitored_files[0],
+                                    setdiff1d(gold_blocks, covered)))
+                return file_blocks, block_size
+
+            def compare_image(gold_ram, monitored_ram, monitored_files):
+                # outputs always go in monitored_checkpoint, even when the
+                # image itself lives in an earlier checkpoint of the chain
+                if len(monitored_files) > 1:
+                    file_blocks, block_size = compare_chain(
+                        gold_ram, monitored_ram, monitored_files)
+                else:
+                    ram_diff = '{}.diff'.format(monitored_ram)
+                    check_call([craff, '--diff', gold_ram, monitored_files[0],
+                                '--output={}'.format(ram_diff)],
+                               cwd=cwd, stdout=DEVNULL)
+                    changed_blocks, block_size = content_blocks(
+                        ram_diff, '{}.content_map'.format(ram_diff))
+                    file_blocks = [(monitored_files[0], changed_blocks)]
                 if self.options.extract_blocks:
-                    extract_diff_blocks(gold_ram, monitored_ram,
-                                        monitored_checkpoint,
-                                        changed_blocks, block_size)
-                for block in changed_blocks:
-                    self.db.result.simics_memory_diff_set.create(
-                        checkpoint=checkpoint,
-                        image_index=image_index,
-                        block=hex(block))
-            return diffs
-
-    # def __compare_checkpoints(self, checkpoint, last_checkpoint):
+                    for monitored_file, changed_blocks in file_blocks:
+                        extract_diff_blocks(gold_ram, monitored_file,
+                                            monitored_checkpoint,
+                                            changed_blocks, block_size)
+                changed_blocks = sort(concatenate(
+                    [changed_blocks for _, changed_blocks in file_blocks]))
+                return changed_blocks.tolist(), block_size
+
+        # def compare_memory(gold_checkpoint, monitored_checkpoint,
+        #                    image_files, executor):
+            gold_rams = ['{}/{}.craff'.format(gold_checkpoint, image)
+                         for image in self.ram_images]
+            monitored_rams = ['{}/{}.craff'.format(monitored_checkpoint, image)
+                              for image in self.ram_images]
+            if image_files is None:
+                image_files = [[monitored_ram]
+                               for monitored_ram in monitored_rams]
+            cwd = '{}/simics-workspace'.format(getcwd())
+            craff = '{}/bin/craff'.format(cwd)
+            return [executor.submit(compare_image, gold_ram, monitored_ram,
+                                    monitored_files)
+                    for gold_ram, monitored_ram, monitored_files
+                    in zip(gold_rams, monitored_rams, image_files)]
+
+        def prepare_checkpoints(checkpoint, incremental_checkpoint):
+            """
+            Returns the monitored checkpoint (merged unless its RAM images can
+            be read from the checkpoint chain), the image files of the chain,
+            the merged gold checkpoint to compare it to, and the lock of the
+            merged gold checkpoint which must be closed once it is no longer
+            read.
+            """
+            monitored_checkpoint = incremental_checkpoint
+            if self.options.merge:
+                image_files = None
+            else:
+                image_files = self.__image_files(incremental_checkpoint)
+            if image_files is None:
+                monitored_checkpoint = \
+                    self.__merge_checkpoint(incremental_checkpoint)
+            gold_incremental_checkpoint = 'gold-checkpoints/{}/{}'.format(
+                self.db.campaign.id, checkpoint)
+            # normally merged during campaign setup, this only waits on (or
+            # performs) the merge for campaigns created before that
+            gold_checkpoint, gold_lock = self.__merge_checkpoint(
+                gold_incremental_checkpoint, lock=True)
+            return monitored_checkpoint, image_files, gold_checkpoint, \
+                gold_lock
+
+        def converged(checkpoint, incremental_checkpoint, memory_errors=None):
+            """
+            Returns True if the state of incremental_checkpoint matches gold
+            checkpoint number checkpoint. Register digests (of every target)
+            are compared first since they are cheap and differ for most faults
+            that are not masked. The config of an incremental checkpoint
+            already contains every object, so the checkpoints are only merged
+            (or their image files resolved) and their RAM images compared
+            (unless memory_errors is already known) if the registers match.
+            """
+            if checkpoint not in self.gold_digests:
+                self.gold_digests[checkpoint] = self.__gold_registers(
+                    checkpoint, 'gold-checkpoints/{}/{}'.format(
+                        self.db.campaign.id, checkpoint)).digest()
+            with simics_config('simics-workspace/{}'.format(
+                    incremental_checkpoint)) as config:
+                digest = register_digest(get_registers(
+                    config, self.gold_targets, self.board))
+            if digest != self.gold_digests[checkpoint]:
+                return False
+            if memory_errors is None:
+                monitored_checkpoint, image_files, gold_checkpoint, \
+                    gold_lock = prepare_checkpoints(checkpoint,
+                                                    incremental_checkpoint)
+                try:
+                    with ThreadPoolExecutor(
+                            max_workers=self.comparison_workers) as executor:
+                        memory_comparisons = compare_memory(
+                            gold_checkpoint, monitored_checkpoint,
+                            image_files, executor)
+                        memory_errors = sum(
+                            len(memory_comparison.result()[0])
+                            for memory_comparison in memory_comparisons)
+                finally:
+                    gold_lock.close()
+            return memory_errors == 0
+
+    # def __compare_checkpoints(self, checkpoint, last_checkpoint, offset=0):
         reg_errors = 0
         mem_errors = 0
-        if self.options.compare_all:
+        if self.options.max_speed:
+            # nothing interacts with the DUT while fast-forwarding, timing is
+            # measured in simulated time so it is unaffected
+            self.__command('disable-real-time-mode')
+        # convergence is only meaningful once no injections remain
+        converge = self.options.converge and \
+            last_checkpoint == self.db.campaign.checkpoints
+        if self.options.compare_all or converge:
             checkpoints = range(checkpoint+1, last_checkpoint+1)
             cycles_between = self.db.campaign.cycles_between
         else:
@@ -952,7 +1536,8 @@ class simics(object):
         for checkpoint in checkpoints:
             self.running = True
             try:
-                self.__command('run-cycles {}'.format(cycles_between),
+                # the first run starts offset cycles past the checkpoint
+                self.__command('run-cycles {}'.format(cycles_between-offset),
                                timeout_=1200 if self.db.campaign.caches
                                else 300 if self.options.compare_all else 600)
             except DrSEUsError as error:
@@ -961,28 +1546,51 @@ class simics(object):
                 raise DrSEUsError('Error continuing simulation')
             else:
                 self.running = False
+            offset = 0
             incremental_checkpoint = 'injected-checkpoints/{}/{}/{}'.format(
                 self.db.campaign.id, self.db.result.id, checkpoint)
             monitor = self.options.compare_all or \
                 checkpoint == self.db.campaign.checkpoints
-            if monitor or checkpoint == last_checkpoint:
+            check = converge and checkpoint < self.db.campaign.checkpoints
+            if monitor or check or checkpoint == last_checkpoint:
                 self.__command('write-configuration {}'.format(
                     incremental_checkpoint), timeout_=300)
             if monitor:
-                monitored_checkpoint = \
-                    self.__merge_checkpoint(incremental_checkpoint)
-                gold_incremental_checkpoint = 'gold-checkpoints/{}/{}'.format(
-                    self.db.campaign.id, checkpoint)
-                gold_checkpoint = '{}_merged'.format(
-                    gold_incremental_checkpoint)
-                if not exists('simics-workspace/{}'.format(gold_checkpoint)):
-                    self.__merge_checkpoint(gold_incremental_checkpoint)
-                errors = compare_registers(
-                    checkpoint, gold_checkpoint, monitored_checkpoint)
-                if errors > reg_errors:
-                    reg_errors = errors
-                errors = compare_memory(
-                    checkpoint, gold_checkpoint, monitored_checkpoint)
-                if errors > reg_errors:
+                monitored_checkpoint, image_files, gold_checkpoint, \
+                    gold_lock = prepare_checkpoints(checkpoint,
+                                                    incremental_checkpoint)
+                # craff runs in other threads while registers are parsed,
+                # database writes are only performed from this thread
+                try:
+                    with ThreadPoolExecutor(
+                            max_workers=self.comparison_workers) as executor:
+                        memory_comparisons = compare_memory(
+                            gold_checkpoint, monitored_checkpoint,
+                            image_files, executor)
+                        errors = compare_registers(
+                            checkpoint, gold_checkpoint, monitored_checkpoint)
+                        if errors > reg_errors:
+                            reg_errors = errors
+                        errors = 0
+                        for image_index, memory_comparison in \
+                                enumerate(memory_comparisons):
+                            changed_blocks, block_size = \
+                                memory_comparison.result()
+                            errors += len(changed_blocks)
+                            self.db.log_memory_diffs(
+                                checkpoint, image_index, changed_blocks,
+                                block_size)
+                finally:
+                    gold_lock.close()
+                if errors > mem_errors:
                     mem_errors = errors
-        return reg_errors, mem_errors
+            if check and converged(checkpoint, incremental_checkpoint,
+                                   errors if monitor else None):
+                self.db.log_event(
+                    'Information', 'Simics', 'Converged',
+                    'Injected state matches gold checkpoint {}, skipped '
+                    'simulating checkpoints {}-{}'.format(
+                        checkpoint, checkpoint+1,
+                        self.db.campaign.checkpoints))
+                return reg_errors, mem_errors, True
+        return reg_errors, mem_errors, False
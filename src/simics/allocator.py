@@ -0,0 +1,44 @@
+"""
+Copyright (c) 2018 NSF Center for Space, High-performance, and Resilient Computing (SHREC)
+University of Pittsburgh. All rights reserved.
+
+Redistribution and use in source and binary forms, with or without modification, are permitted provided
+that the following conditions are met:
+1. Redistributions of source code must retain the above copyright notice,
+   this list of conditions and the following disclaimer.
+2. Redistributions in binary form must reproduce the above copyright notice,
+   this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS AS IS AND ANY EXPRESS OR IMPLIED WARRANTIES, 
+INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. 
+IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR 
+CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT 
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY
+OF SUCH DAMAGE.
+"""
+
+from fcntl import flock, LOCK_EX, LOCK_NB
+from os import makedirs
+from os.path import join
+from time import sleep
+
+
+def acquire_slot(directory, slots, poll=1):
+    """
+    Block until one of slots numbered slots (shared by every process using
+    directory) is free and return its number along with the open lock file
+    that holds it. The slot is released by closing the lock file, which the
+    kernel also does if the process dies, so slots are never leaked.
+    """
+    makedirs(directory, exist_ok=True)
+    while True:
+        for slot in range(slots):
+            lock = open(join(directory, '{}.lock'.format(slot)), 'w')
+            try:
+                flock(lock, LOCK_EX | LOCK_NB)
+            except BlockingIOError:
+                lock.close()
+            else:
+                return slot, lock
+        sleep(poll)
@@ -18,6 +18,9 @@ OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER
 OF SUCH DAMAGE.
 """
 
+from os.path import isabs, join
+from re import compile, MULTILINE
+
 from ply import lex, yacc
 
 
@@ -61,7 +64,8 @@ def t_ID(t):
 
 def t_newline(t):
     r'\n+'
-    t.lineno += len(t.value)
+    t.lexer.lineno += len(t.value)
+
 
 t_ignore = ' \t\r'
 
@@ -79,9 +83,9 @@ def p_configuration(p):
 
 def p_objects(p):
     'objects : objects object'
-    (name, typ, attrs) = p[2]
+    (name, typ, attrs, spans) = p[2]
     p[0] = p[1]
-    p[0][name] = (typ, attrs)
+    p[0][name] = (typ, attrs, spans)
 
 
 def p_objects_empty(p):
@@ -91,24 +95,32 @@ def p_objects_empty(p):
 
 def p_object(p):
     'object : OBJECT ID TYPE ID LBRAC attributes RBRAC'
-    p[0] = (p[2], p[4], p[6])
+    (attrs, positions) = p[6]
+    # each attribute spans up to the start of the next one (or the end of the
+    # object), the end of the object is stored under None for new attributes
+    starts = sorted(positions.items(), key=lambda position: position[1])
+    ends = [start for name, start in starts[1:]] + [p.lexpos(7)]
+    spans = {name: (start, end) for (name, start), end in zip(starts, ends)}
+    spans[None] = (p.lexpos(7), p.lexpos(7))
+    p[0] = (p[2], p[4], attrs, spans)
 
 
 def p_attributes(p):
     'attributes : attributes attribute'
-    (name, value) = p[2]
+    (name, value, position) = p[2]
     p[0] = p[1]
-    p[0][name] = value
+    p[0][0][name] = value
+    p[0][1][name] = position
 
 
 def p_attributes_empty(p):
     'attributes : empty'
-    p[0] = {}
+    p[0] = ({}, {})
 
 
 def p_attribute(p):
     'attribute : ID COLON value'
-    p[0] = (p[1], p[3])
+    p[0] = (p[1], p[3], p.lexpos(1))
 
 
 def p_value_id(p):
@@ -201,8 +213,18 @@ class ParseError(Exception):
 def p_error(p):
     raise ParseError(p)
 
-lex.lex(debug=0, optimize=1)
-yacc.yacc(debug=0, optimize=1)
+
+lexer = lex.lex(debug=0, optimize=1)
+parser = yacc.yacc(debug=0, optimize=1)
+
+# matches the header of each object in a checkpoint config, used to index the
+# byte offsets of objects without parsing their attributes
+object_header = compile(rb'^OBJECT[ \t]+(\S+)[ \t]+TYPE[ \t]+(\S+)[ \t]*{',
+                        MULTILINE)
+
+# matches a reference to an entry of the checkpoint_path of the sim object
+# at the start of an image file name (e.g. "%2%/DUT_a9x2.coretile...")
+checkpoint_path_reference = compile(r'^%(\d+)%/?')
 
 
 class SimicsConfigError(Exception):
@@ -215,19 +237,61 @@ class SimicsConfigError(Exception):
                 '{}\n'.format(self.error) if self.error else '', self.reason)
 
 
+def attribute_string(attribute):
+    if isinstance(attribute, data_list):
+        return '['+' '.join(attribute_string(value)
+                            for value in attribute)+']'
+    elif isinstance(attribute, list):
+        return '('+','.join(attribute_string(value)
+                            for value in attribute)+')'
+    elif isinstance(attribute, dict):
+        return '{'+','.join(attribute_string(key)+':' +
+                            attribute_string(attribute[key]) for key
+                            in attribute)+'}'
+    return attribute
+
+
 class simics_config(object):
+    """
+    Checkpoint config reader that only parses the objects that are accessed.
+    The config file is scanned once to index the byte offset of each object,
+    and objects are parsed the first time they are used. Saving only rewrites
+    the attributes that were set, the rest of the file is copied unchanged.
+    """
+
     def __init__(self, checkpoint):
         self.checkpoint = checkpoint
 
     def __enter__(self):
         try:
-            with open('{}/config'.format(self.checkpoint), 'r') as config_file:
-                config_contents = config_file.read()
+            with open('{}/config'.format(self.checkpoint), 'rb') as config_file:
+                self.contents = config_file.read()
         except EnvironmentError as error:
             raise SimicsConfigError(
                 'Error reading checkpoint: {}'.format(error))
+        self.index = {}
+        headers = list(object_header.finditer(self.contents))
+        for header, next_header in zip(headers, headers[1:]+[None]):
+            self.index[header.group(1).decode('latin-1')] = (
+                header.start(), next_header.start() if next_header is not None
+                else len(self.contents))
+        self.config = {}
+        self.spans = {}
+        self.modified = {}
+        return self
+
+    def __parse(self, object_):
+        if object_ in self.config:
+            return self.config[object_]
+        if object_ not in self.index:
+            return None
+        start, end = self.index[object_]
+        lexer.lineno = self.contents.count(b'\n', 0, start) + 1
         try:
-            self.config = yacc.parse(config_contents)
+            # latin-1 maps each byte to one character, so lexer positions are
+            # also byte offsets into the config file
+            objects = parser.parse(
+                self.contents[start:end].decode('latin-1'), lexer=lexer)
         except RuntimeError as error:
             raise SimicsConfigError('Parse error in {}'.format(self.checkpoint),
                                     error)
@@ -239,46 +303,79 @@ class simics_config(object):
                     error)
             raise SimicsConfigError(
                 'Unknown parse error in {}'.format(self.checkpoint), error)
-        return self
+        for name, (type_, attributes, spans) in objects.items():
+            self.config[name] = (type_, attributes)
+            self.spans[name] = {
+                attribute: (start+span_start, start+span_end)
+                for attribute, (span_start, span_end) in spans.items()}
+        return self.config.get(object_)
 
     def save(self):
-
-        def attribute_string(attribute):
-            if isinstance(attribute, data_list):
-                return '['+' '.join(attribute_string(value)
-                                    for value in attribute)+']'
-            elif isinstance(attribute, list):
-                return '('+','.join(attribute_string(value)
-                                    for value in attribute)+')'
-            elif isinstance(attribute, dict):
-                return '{'+','.join(attribute_string(key)+':' +
-                                    attribute_string(attribute[key]) for key
-                                    in attribute)+'}'
-            return attribute
-
-    # def save(self):
-        with open(self.checkpoint+'/config', 'w') as config_file:
-            config_file.write('#SIMICS-CONF-1\n')
-            for object_ in self.config:
-                (type_, attirbutes) = self.config[object_]
-                config_file.write(
-                    'OBJECT {} TYPE {} {}\n'.format(object_, type_, '{'))
-                for attribute in attirbutes:
-                    config_file.write('\t{}: {}\n'.format(
-                        attribute, attribute_string(attirbutes[attribute])))
-                config_file.write('}\n')
+        patches = []
+        for object_, attributes in self.modified.items():
+            (type_, values) = self.config[object_]
+            for attribute in attributes:
+                if attribute in self.spans[object_]:
+                    start, end = self.spans[object_][attribute]
+                    # keep the whitespace between this attribute and the next
+                    end = start + len(self.contents[start:end].rstrip())
+                    patch = '{}: {}'
+                else:
+                    start, end = self.spans[object_][None]
+                    patch = '\t{}: {}\n'
+                patches.append((start, end, patch.format(
+                    attribute, attribute_string(values[attribute])
+                ).encode('latin-1')))
+        contents = memoryview(self.contents)
+        position = 0
+        with open(self.checkpoint+'/config', 'wb') as config_file:
+            for start, end, patch in sorted(patches):
+                config_file.write(contents[position:start])
+                config_file.write(patch)
+                position = end
+            config_file.write(contents[position:])
+
+    def image_files(self, image):
+        """
+        Returns the files that contain the data of image, oldest first, with
+        references to the checkpoint_path of the sim object resolved. Files of
+        an incremental checkpoint only contain the data that changed since the
+        checkpoint it was created from.
+        """
+        files = self.get(image, 'files')
+        if files is None:
+            return []
+        checkpoint_path = [path.strip('"') for path in
+                           self.get('sim', 'checkpoint_path') or []]
+        image_files = []
+        for file_ in files:
+            file_name = file_[0].strip('"')
+            reference = checkpoint_path_reference.match(file_name)
+            if reference:
+                path = int(reference.group(1))
+                if path >= len(checkpoint_path):
+                    raise SimicsConfigError(
+                        'Invalid checkpoint path reference in {}: {}'.format(
+                            self.checkpoint, file_name))
+                file_name = join(checkpoint_path[path],
+                                 file_name[reference.end():])
+            elif not isabs(file_name):
+                file_name = join(self.checkpoint, file_name)
+            image_files.append(file_name)
+        return image_files
 
     def get(self, object_, attribute):
-        if object_ in self.config:
+        if self.__parse(object_) is not None:
             (type_, attirbutes) = self.config[object_]
             if attribute in attirbutes:
                 return attirbutes[attribute]
         return None
 
     def set(self, object_, attribute, value):
-        if object_ in self.config:
+        if self.__parse(object_) is not None:
             (type_, attirbutes) = self.config[object_]
             attirbutes[attribute] = value
+            self.modified.setdefault(object_, set()).add(attribute)
 
     def __exit__(self, type_, value, traceback):
         if type_ is not None or value is not None or traceback is not None:
@@ -0,0 +1,152 @@
+"""
+Copyright (c) 2018 NSF Center for Space, High-performance, and Resilient Computing (SHREC)
+University of Pittsburgh. All rights reserved.
+
+Redistribution and use in source and binary forms, with or without modification, are permitted provided
+that the following conditions are met:
+1. Redistributions of source code must retain the above copyright notice,
+   this list of conditions and the following disclaimer.
+2. Redistributions in binary form must reproduce the above copyright notice,
+   this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS AS IS AND ANY EXPRESS OR IMPLIED WARRANTIES, 
+INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. 
+IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR 
+CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT 
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY
+OF SUCH DAMAGE.
+"""
+
+from json import dump, load
+from os.path import exists
+from re import compile
+
+# an instruction line of the Simics tracer, the processor is given either by
+# number ("CPU  0") or by object name ("board.soc.cpu[0]")
+instruction_pattern = compile(
+    r'^inst:\s*\[\s*\d+\]\s+(?:CPU\s+(\d+)|\S*?\[(\d+)\])\s+'
+    r'<v:[^>]*>\s+<p:[^>]*>\s+[0-9a-fA-F]+\s+(\S+)\s*(.*)$')
+register_pattern = compile(r'\b(r\d+|sb|sl|fp|ip)\b')
+register_range_pattern = compile(r'\br(\d+)\s*-\s*r(\d+)\b')
+
+register_aliases = {'sb': 'r9', 'sl': 'r10', 'fp': 'r11', 'ip': 'r12'}
+
+# instructions that unconditionally overwrite their first register operand
+# (after reading the rest), anything else is treated as only reading its
+# registers, which can only make a register look live, the two operand forms
+# of the instructions that are not in unary_instructions (e.g. Thumb
+# "adds r0, #1") also read their destination
+write_instructions = {
+    'a9': {'adc', 'add', 'and', 'asr', 'bic', 'clz', 'eor', 'ldr', 'ldrb',
+           'ldrh', 'ldrsb', 'ldrsh', 'lsl', 'lsr', 'mov', 'movw', 'mul', 'mvn',
+           'orr', 'ror', 'rsb', 'rsc', 'sbc', 'sbfx', 'sub', 'sxtb', 'sxth',
+           'ubfx', 'uxtb', 'uxth'},
+    'p2020': {'add', 'addc', 'adde', 'addi', 'addic', 'addis', 'addme',
+              'addze', 'and', 'andc', 'andi', 'andis', 'cntlzw', 'divw',
+              'divwu', 'eqv', 'extsb', 'extsh', 'lbz', 'lbzx', 'lha', 'lhax',
+              'lhz', 'lhzx', 'li', 'lis', 'lwz', 'lwzx', 'mfcr', 'mfctr',
+              'mflr', 'mfmsr', 'mfspr', 'mr', 'mulhw', 'mulhwu', 'mulli',
+              'mullw', 'nand', 'neg', 'nor', 'not', 'or', 'orc', 'ori', 'oris',
+              'rlwinm', 'slw', 'sraw', 'srawi', 'srw', 'subf', 'subfc',
+              'subfe', 'subfic', 'subfme', 'subfze', 'xor', 'xori', 'xoris'}}
+
+# moves, loads, and other instructions of write_instructions whose destination
+# is never one of their sources
+unary_instructions = {
+    'a9': {'clz', 'ldr', 'ldrb', 'ldrh', 'ldrsb', 'ldrsh', 'mov', 'movw',
+           'mvn', 'sxtb', 'sxth', 'uxtb', 'uxth'},
+    'p2020': {'addme', 'addze', 'cntlzw', 'extsb', 'extsh', 'lbz', 'lbzx',
+              'lha', 'lhax', 'lhz', 'lhzx', 'li', 'lis', 'lwz', 'lwzx', 'mfcr',
+              'mfctr', 'mflr', 'mfmsr', 'mfspr', 'mr', 'neg', 'not', 'subfme',
+              'subfze'}}
+
+# registers that can be reported dead, FIQ mode banks r8-r12 and r13-r15 are
+# banked in every exception mode on ARM, so a write to them in the trace may
+# not be to the injected register
+traced_registers = {
+    'a9': {'r{}'.format(register) for register in range(8)},
+    'p2020': {'r{}'.format(register) for register in range(32)}}
+
+# the low bits of a register overwritten by every instruction of
+# write_instructions, the rest of a wider register (the upper word of the 64
+# bit GPRs of p2020) keeps its value, so a fault in it is not masked
+written_bits = {'a9': 32, 'p2020': 32}
+
+
+def instruction_accesses(architecture, mnemonic, operands):
+    """
+    Returns the registers read and the register written (or None) by an
+    instruction as disassembled by Simics.
+    """
+    operands = operands.split(';')[0]
+    operands = register_range_pattern.sub(
+        lambda match: ','.join('r{}'.format(register) for register in range(
+            int(match.group(1)), int(match.group(2))+1)), operands)
+    registers = [register_aliases.get(register, register)
+                 for register in register_pattern.findall(operands)]
+    mnemonic = mnemonic.lower().split('.')[0]
+    if architecture == 'a9' and mnemonic not in write_instructions['a9'] and \
+            mnemonic.endswith('s'):
+        # flag setting variants, any other suffix is a condition code and a
+        # conditional write may not happen
+        mnemonic = mnemonic[:-1]
+    if registers and mnemonic in write_instructions[architecture] and \
+            operands.lstrip().startswith(registers[0]):
+        if mnemonic in unary_instructions[architecture] or \
+                len(operands.split(',')) >= 3:
+            return registers[1:], registers[0]
+        return registers, registers[0]
+    return registers, None
+
+
+def first_accesses(trace_file, architecture):
+    """
+    Returns the registers of each processor in trace_file (the output of the
+    Simics tracer) that are overwritten before they are read.
+    """
+    accesses = {}
+    with open(trace_file) as trace:
+        for line in trace:
+            match = instruction_pattern.match(line)
+            if match is None:
+                continue
+            processor = int(match.group(1) or match.group(2))
+            reads, write = instruction_accesses(
+                architecture, match.group(3), match.group(4))
+            processor_accesses = accesses.setdefault(processor, {})
+            for register in reads:
+                processor_accesses.setdefault(register, False)
+            if write is not None:
+                processor_accesses.setdefault(write, True)
+    return {processor: sorted(
+                register for register, written in processor_accesses.items()
+                if written and register in traced_registers[architecture])
+            for processor, processor_accesses in accesses.items()}
+
+
+def save_liveness(liveness_file, checkpoint, dead_registers):
+    if exists(liveness_file):
+        with open(liveness_file) as data:
+            liveness = load(data)
+    else:
+        liveness = {}
+    liveness[str(checkpoint)] = {str(processor): registers for
+                                 processor, registers in dead_registers.items()}
+    with open(liveness_file, 'w') as data:
+        dump(liveness, data)
+
+
+def load_liveness(liveness_file):
+    """
+    Returns a set of the (checkpoint, processor, register) that are dead when
+    the gold checkpoint is loaded, i.e. injections into them are masked.
+    """
+    if not exists(liveness_file):
+        return set()
+    with open(liveness_file) as data:
+        liveness = load(data)
+    return {(int(checkpoint), int(processor), register)
+            for checkpoint, processors in liveness.items()
+            for processor, registers in processors.items()
+            for register in registers}
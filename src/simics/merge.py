@@ -0,0 +1,93 @@
+"""
+Copyright (c) 2018 NSF Center for Space, High-performance, and Resilient Computing (SHREC)
+University of Pittsburgh. All rights reserved.
+
+Redistribution and use in source and binary forms, with or without modification, are permitted provided
+that the following conditions are met:
+1. Redistributions of source code must retain the above copyright notice,
+   this list of conditions and the following disclaimer.
+2. Redistributions in binary form must reproduce the above copyright notice,
+   this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS AS IS AND ANY EXPRESS OR IMPLIED WARRANTIES, 
+INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. 
+IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR 
+CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT 
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY
+OF SUCH DAMAGE.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from fcntl import flock, LOCK_EX, LOCK_SH
+from os import remove
+from os.path import abspath, exists, join
+from shutil import rmtree
+from subprocess import check_call, DEVNULL
+
+
+def lock_merged_checkpoint(checkpoint, workspace='simics-workspace'):
+    """
+    Merge checkpoint (relative to workspace) into checkpoint_merged unless it
+    has already been merged and return the name of the merged checkpoint and
+    the open checkpoint_merged.lock holding a shared lock. The merged
+    checkpoint is not evicted (see storage) until the lock is closed. An
+    exclusive lock is held while merging so that each checkpoint is merged
+    exactly once by any number of processes. A merge that was interrupted
+    leaves checkpoint_merged.partial behind and is redone.
+    """
+    workspace = abspath(workspace)
+    merged_checkpoint = '{}_merged'.format(checkpoint)
+    merged_path = join(workspace, merged_checkpoint)
+    partial = '{}.partial'.format(merged_path)
+    # truncated on every use, so its mtime is the time of last use
+    lock = open('{}.lock'.format(merged_path), 'w')
+    try:
+        flock(lock, LOCK_SH)
+        if exists(partial) or not exists(merged_path):
+            # converting the lock releases it first, so check again
+            flock(lock, LOCK_EX)
+            if exists(partial):
+                rmtree(merged_path, ignore_errors=True)
+            if not exists(merged_path):
+                open(partial, 'w').close()
+                check_call([join(workspace, 'bin', 'checkpoint-merge'),
+                            checkpoint, merged_checkpoint],
+                           cwd=workspace, stdout=DEVNULL)
+                remove(partial)
+            flock(lock, LOCK_SH)
+    except BaseException:
+        lock.close()
+        raise
+    return merged_checkpoint, lock
+
+
+def merge_checkpoint(checkpoint, workspace='simics-workspace'):
+    """
+    Merge checkpoint (relative to workspace) into checkpoint_merged unless it
+    has already been merged and return the name of the merged checkpoint.
+    """
+    merged_checkpoint, lock = lock_merged_checkpoint(checkpoint, workspace)
+    lock.close()
+    return merged_checkpoint
+
+
+# merging is bound by disk bandwidth rather than CPU, so more processes than
+# this only compete for the disk
+merge_processes = 4
+
+
+def merge_gold_checkpoints(campaign_id, checkpoints, processes=None,
+                           workspace='simics-workspace'):
+    """
+    Merge gold checkpoints 1 through checkpoints of campaign_id using a pool of
+    processes (merge_processes by default).
+    """
+    if processes is None:
+        processes = merge_processes
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        return list(executor.map(
+            merge_checkpoint,
+            ['gold-checkpoints/{}/{}'.format(campaign_id, checkpoint)
+             for checkpoint in range(1, checkpoints+1)],
+            [workspace]*checkpoints))
@@ -0,0 +1,114 @@
+"""
+Copyright (c) 2018 NSF Center for Space, High-performance, and Resilient Computing (SHREC)
+University of Pittsburgh. All rights reserved.
+
+Redistribution and use in source and binary forms, with or without modification, are permitted provided
+that the following conditions are met:
+1. Redistributions of source code must retain the above copyright notice,
+   this list of conditions and the following disclaimer.
+2. Redistributions in binary form must reproduce the above copyright notice,
+   this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS AS IS AND ANY EXPRESS OR IMPLIED WARRANTIES, 
+INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. 
+IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR 
+CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT 
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY
+OF SUCH DAMAGE.
+"""
+
+from codecs import getincrementaldecoder
+from io import IncrementalNewlineDecoder
+from os import read
+from selectors import DefaultSelector, EVENT_READ
+from threading import Condition, Thread
+from time import monotonic
+
+
+class simics_pipes(object):
+    """
+    Continuously drains the stdout and stderr pipes of a Simics process in a
+    background thread, reading large chunks from whichever pipe a selector
+    reports as ready. Unconsumed stdout is kept until read_until() finds the
+    prompt, only the last stderr_limit characters of stderr are kept.
+    """
+
+    chunk_size = 1 << 16
+
+    def __init__(self, process, stderr_limit=1 << 20):
+        self.stdout = ''
+        self.stderr = ''
+        self.stderr_limit = stderr_limit
+        self.closed = False
+        self.condition = Condition()
+        self.thread = Thread(target=self.__read, args=[process], daemon=True)
+        self.thread.start()
+
+    def __read(self, process):
+        decoders = {}
+        with DefaultSelector() as selector:
+            for pipe in process.stdout, process.stderr:
+                selector.register(pipe.fileno(), EVENT_READ)
+                decoders[pipe.fileno()] = IncrementalNewlineDecoder(
+                    getincrementaldecoder('utf-8')('replace'), translate=True)
+            stdout_fd = process.stdout.fileno()
+            while selector.get_map():
+                for key, events in selector.select():
+                    data = read(key.fd, self.chunk_size)
+                    if not data:
+                        selector.unregister(key.fd)
+                    text = decoders[key.fd].decode(data, final=not data)
+                    with self.condition:
+                        if key.fd == stdout_fd:
+                            self.stdout += text
+                            if not data:
+                                self.closed = True
+                        else:
+                            self.stderr = \
+                                (self.stderr + text)[-self.stderr_limit:]
+                        self.condition.notify_all()
+
+    def read_until(self, prompt, timeout, output=None):
+        """
+        Consume stdout through the next occurrence of prompt (or until the
+        pipe is closed) and return it along with whether reading stopped
+        because no output arrived for timeout seconds. If output is given it
+        is called with each piece of stdout as soon as it arrives.
+        """
+        emitted = searched = 0
+        deadline = monotonic() + timeout
+        with self.condition:
+            while True:
+                index = self.stdout.find(prompt, searched)
+                if index >= 0:
+                    available = index + len(prompt)
+                else:
+                    available = len(self.stdout)
+                if output is not None and available > emitted:
+                    output(self.stdout[emitted:available])
+                    emitted = available
+                if index >= 0 or self.closed:
+                    end = available
+                    buff, self.stdout = self.stdout[:end], self.stdout[end:]
+                    return buff, False
+                searched = max(0, len(self.stdout) - len(prompt) + 1)
+                length = len(self.stdout)
+                while len(self.stdout) == length and not self.closed:
+                    remaining = deadline - monotonic()
+                    if remaining <= 0:
+                        buff, self.stdout = self.stdout, ''
+                        return buff, True
+                    self.condition.wait(remaining)
+                deadline = monotonic() + timeout
+
+    def take_stderr(self, timeout=None):
+        """
+        Return and clear the stderr collected so far, first waiting up to
+        timeout seconds for the pipes to be closed if timeout is given.
+        """
+        if timeout is not None:
+            self.thread.join(timeout)
+        with self.condition:
+            stderr, self.stderr = self.stderr, ''
+        return stderr
@@ -0,0 +1,338 @@
+"""
+Copyright (c) 2018 NSF Center for Space, High-performance, and Resilient Computing (SHREC)
+University of Pittsburgh. All rights reserved.
+
+Redistribution and use in source and binary forms, with or without modification, are permitted provided
+that the following conditions are met:
+1. Redistributions of source code must retain the above copyright notice,
+   this list of conditions and the following disclaimer.
+2. Redistributions in binary form must reproduce the above copyright notice,
+   this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS AS IS AND ANY EXPRESS OR IMPLIED WARRANTIES, 
+INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. 
+IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR 
+CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT 
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY
+OF SUCH DAMAGE.
+"""
+
+from bisect import bisect_right
+from hashlib import sha256
+from json import dump, load
+from numpy import (arange, array, bincount, concatenate, cumsum, dtype,
+                   fromiter, int64, nonzero, ones, repeat, uint16, uint64,
+                   where, zeros)
+from numpy import load as load_array
+from numpy import save as save_array
+from os import getpid, makedirs, rename
+from os.path import exists, join
+from shutil import rmtree
+
+from .config import data_list
+
+# one row per register element, the value of each element is stored as words
+# (least significant first) in a separate array starting at start
+element_type = dtype([('index', 'S32'), ('data', '?'), ('negative', '?'),
+                      ('start', 'u8'), ('words', 'u2')])
+
+word_mask = (1 << 64) - 1
+
+
+def get_registers(config, targets, board):
+    """
+    Retrieves all the register values of the targets specified in targets from
+    config and returns a dictionary of config objects with the values of their
+    registers.
+    """
+    registers = {}
+    for target in targets:
+        if 'count' in targets[target]:
+            count = targets[target]['count']
+        else:
+            count = 1
+        for target_index in range(count):
+            if 'type' in targets[target] and \
+                    targets[target]['type'] == 'gcache':
+                config_object = targets[target]['object']
+            else:
+                config_object = 'DUT_{}.{}'.format(
+                    board, targets[target]['object'])
+            if count > 1:
+                config_object += '[{}]'.format(target_index)
+            if config_object not in registers:
+                registers[config_object] = {}
+            for register in targets[target]['registers']:
+                if 'alias' in targets[target]['registers'][register]:
+                    register = (targets[target]['registers'][register]
+                                       ['alias']['register'])
+                if register not in registers[config_object]:
+                    registers[config_object][register] = \
+                        config.get(config_object, register)
+    return registers
+
+
+def flatten_register(value, index=''):
+    """
+    Yields (index, value, data) for every element of a register value, where
+    index is appended to the register name (e.g. ":3:1") and data is True for
+    cache data.
+    """
+    if isinstance(value, data_list):
+        yield index, '0x'+value[0], True
+    elif isinstance(value, str) and value[0] == '[' and value[-1] == ']':
+        # for some reason we might get
+        # string '[000...000]' instead of a data_list
+        yield index, '0x'+value[1:-1], True
+    elif isinstance(value, list):
+        for element_index, element in enumerate(value):
+            yield from flatten_register(element, '{}:{}'.format(
+                index, element_index))
+    else:
+        yield index, value, False
+
+
+def register_values(value):
+    """
+    Yields the value of every element of a register value in the same order as
+    flatten_register, without building the index of each element.
+    """
+    if isinstance(value, data_list):
+        yield '0x'+value[0]
+    elif isinstance(value, str) and value[0] == '[' and value[-1] == ']':
+        yield '0x'+value[1:-1]
+    elif isinstance(value, list):
+        for element in value:
+            yield from register_values(element)
+    else:
+        yield value
+
+
+def value_words(value):
+    value = int(value, base=0)
+    negative = value < 0
+    value = abs(value)
+    words = [value & word_mask]
+    value >>= 64
+    while value:
+        words.append(value & word_mask)
+        value >>= 64
+    return negative, words
+
+
+def value_arrays(values):
+    """
+    Returns the signs, word counts, and words (concatenated) of values, a list
+    of register element values, as arrays in the form of value_words. The
+    values are parsed in one pass and values that fit in a single word (nearly
+    all of them) are converted to words at once, only wider or negative values
+    are split into words one at a time.
+    """
+    integers = fromiter((int(value, base=0) for value in values), dtype=object,
+                        count=len(values))
+    if not len(integers) or \
+            ((integers >= 0) & (integers <= word_mask)).all():
+        return (zeros(len(integers), dtype=bool),
+                ones(len(integers), dtype=uint16),
+                integers.astype(uint64))
+    negatives = []
+    counts = []
+    words = []
+    for value in integers:
+        negative, value_words_ = value_words(hex(value))
+        negatives.append(negative)
+        counts.append(len(value_words_))
+        words.extend(value_words_)
+    return (array(negatives, dtype=bool), array(counts, dtype=uint16),
+            array(words, dtype=uint64))
+
+
+def words_digest(negatives, counts, words):
+    """
+    Returns the digest of elements given as arrays in the form of
+    value_arrays, each element is hashed as its sign, word count, and words
+    (64-bit little endian). The byte stream is assembled with array
+    operations.
+    """
+    counts = counts.astype(int64)
+    offsets = cumsum(counts + 2) - (counts + 2)
+    stream = zeros(int(counts.sum()) + 2*len(counts), dtype='<u8')
+    stream[offsets] = negatives
+    stream[offsets+1] = counts
+    elements = repeat(arange(len(counts)), counts)
+    positions = arange(len(words)) - (cumsum(counts) - counts)[elements]
+    stream[offsets[elements]+2+positions] = words
+    return sha256(stream.tobytes()).hexdigest()
+
+
+def words_value(negative, words):
+    value = 0
+    for word in reversed(words):
+        value = (value << 64) | int(word)
+    return '{}{:#x}'.format('-' if negative else '', value)
+
+
+def register_digest(registers):
+    """
+    Returns a digest of registers (as returned by get_registers) that is equal
+    to register_snapshot.digest() of a snapshot with the same values. Each
+    element is hashed as its sign, word count, and words (64-bit little
+    endian) in order of config object and register name.
+    """
+    values = [value for config_object, register in sorted(
+                  (config_object, register) for config_object in registers
+                  for register in registers[config_object])
+              for value in register_values(registers[config_object][register])]
+    return words_digest(*value_arrays(values))
+
+
+def save_register_snapshot(directory, registers):
+    """
+    Saves registers (as returned by get_registers) to directory. The snapshot
+    is written to a temporary directory first so that concurrent processes
+    never load a partially written snapshot.
+    """
+    groups = []
+    indices = []
+    data = []
+    values = []
+    for config_object in registers:
+        for register in registers[config_object]:
+            start = len(indices)
+            for index, value, data_ in flatten_register(
+                    registers[config_object][register]):
+                indices.append(index.encode('utf-8'))
+                data.append(data_)
+                values.append(value)
+            groups.append((config_object, register, start, len(indices)))
+    negatives, counts, words = value_arrays(values)
+    elements = zeros(len(indices), dtype=element_type)
+    elements['index'] = indices
+    elements['data'] = data
+    elements['negative'] = negatives
+    elements['start'] = cumsum(counts, dtype=uint64) - counts
+    elements['words'] = counts
+    temp_directory = '{}.{}'.format(directory, getpid())
+    makedirs(temp_directory)
+    with open(join(temp_directory, 'groups.json'), 'w') as groups_file:
+        dump(groups, groups_file)
+    save_array(join(temp_directory, 'elements.npy'), elements)
+    save_array(join(temp_directory, 'values.npy'), words)
+    try:
+        rename(temp_directory, directory)
+    except OSError:
+        # another process saved the snapshot first
+        rmtree(temp_directory)
+        if not exists(directory):
+            raise
+
+
+class register_snapshot(object):
+    def __init__(self, directory):
+        with open(join(directory, 'groups.json'), 'r') as groups_file:
+            self.groups = {(config_object, register): (start, end)
+                           for config_object, register, start, end
+                           in load(groups_file)}
+        self.elements = load_array(join(directory, 'elements.npy'),
+                                   mmap_mode='r')
+        self.values = load_array(join(directory, 'values.npy'), mmap_mode='r')
+
+    def get(self, config_object, register):
+        """
+        Yields (index, value, data) for every element of register in the same
+        form as flatten_register.
+        """
+        start, end = self.groups[(config_object, register)]
+        for element in self.elements[start:end]:
+            yield (element['index'].decode('utf-8'),
+                   words_value(element['negative'], self.values[
+                       element['start']:element['start']+element['words']]),
+                   bool(element['data']))
+
+    def digest(self):
+        """
+        Returns the digest of the snapshot in the form of register_digest, the
+        byte stream is assembled with array operations.
+        """
+        if not self.groups:
+            return sha256().hexdigest()
+        elements = self.elements[concatenate([
+            arange(*self.groups[group]) for group in sorted(self.groups)])]
+        counts = elements['words'].astype(int64)
+        word_elements = repeat(arange(len(elements)), counts)
+        positions = arange(len(word_elements)) - \
+            (cumsum(counts) - counts)[word_elements]
+        return words_digest(elements['negative'], counts, self.values[
+            elements['start'][word_elements].astype(int64) + positions])
+
+    def diff(self, registers):
+        """
+        Compares registers (as returned by get_registers) to the snapshot and
+        returns a list of (config_object, register, gold_value,
+        monitored_value) for every element that differs, and a list of
+        (config_object, register) for gold elements that are missing.
+        Elements are flattened into arrays aligned with the snapshot and
+        compared at once, names are only created for elements that differ.
+        """
+        diffs = []
+        missing = []
+        rows = []
+        monitored = []
+        all_values = []
+        for config_object in registers:
+            for register in registers[config_object]:
+                start, end = self.groups[(config_object, register)]
+                values = list(register_values(
+                    registers[config_object][register]))
+                if len(values) != end - start:
+                    # fall back to matching elements by index
+                    monitored_values = {
+                        index: value for index, value, data in
+                        flatten_register(registers[config_object][register])}
+                    for index, gold_value, data in self.get(config_object,
+                                                            register):
+                        if index not in monitored_values:
+                            missing.append((config_object,
+                                            '{}{}'.format(register, index)))
+                        elif int(monitored_values[index], base=0) != \
+                                int(gold_value, base=0):
+                            diffs.append((
+                                config_object, '{}{}'.format(register, index),
+                                gold_value, monitored_values[index]))
+                    continue
+                rows.append(arange(start, end))
+                monitored.append((len(all_values), config_object, register,
+                                  values))
+                all_values.extend(values)
+        if not all_values:
+            return diffs, missing
+        gold = self.elements[concatenate(rows)]
+        negatives, counts, words = value_arrays(all_values)
+        mismatches = (gold['negative'] != negatives) | \
+            (gold['words'] != counts)
+        # compare each monitored word to the gold word at the same position of
+        # the same element, positions beyond the gold element are mismatches
+        elements = repeat(arange(len(counts)), counts)
+        starts = cumsum(counts, dtype=int64) - counts
+        positions = arange(len(words)) - starts[elements]
+        valid = positions < gold['words'][elements]
+        gold_words = self.values[where(
+            valid, gold['start'][elements].astype(int64) + positions, 0)] \
+            if len(self.values) else zeros(len(words), dtype=uint64)
+        mismatches |= bincount(elements[~valid | (gold_words != words)],
+                               minlength=len(counts)).astype(bool)
+        group_starts = [group[0] for group in monitored]
+        for element in nonzero(mismatches)[0]:
+            group_start, config_object, register, values = monitored[
+                bisect_right(group_starts, element) - 1]
+            value = values[element - group_start]
+            diffs.append((
+                config_object,
+                '{}{}'.format(register,
+                              gold['index'][element].decode('utf-8')),
+                words_value(gold['negative'][element], self.values[
+                    gold['start'][element]:
+                    gold['start'][element]+gold['words'][element]]),
+                value))
+        return diffs, missing
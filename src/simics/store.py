@@ -0,0 +1,100 @@
+"""
+Copyright (c) 2018 NSF Center for Space, High-performance, and Resilient Computing (SHREC)
+University of Pittsburgh. All rights reserved.
+
+Redistribution and use in source and binary forms, with or without modification, are permitted provided
+that the following conditions are met:
+1. Redistributions of source code must retain the above copyright notice,
+   this list of conditions and the following disclaimer.
+2. Redistributions in binary form must reproduce the above copyright notice,
+   this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS AS IS AND ANY EXPRESS OR IMPLIED WARRANTIES, 
+INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. 
+IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR 
+CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT 
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY
+OF SUCH DAMAGE.
+"""
+
+from hashlib import sha256
+from os import link, listdir, lstat, makedirs, remove, rename, rmdir
+from os.path import exists, isdir, join
+
+checkpoint_store = 'simics-workspace/checkpoint-store'
+
+
+def file_hash(file_, chunk_size=1 << 20):
+    hash_ = sha256()
+    with open(file_, 'rb') as data:
+        for chunk in iter(lambda: data.read(chunk_size), b''):
+            hash_.update(chunk)
+    return hash_.hexdigest()
+
+
+def store_checkpoint(checkpoint, store=checkpoint_store):
+    """
+    Replace the files of checkpoint with hard links to blobs in store named by
+    their content hash, so that identical files (e.g. the boot-time RAM images
+    of campaigns sharing a board and kernel) are only stored once. The config
+    refers to its own campaign and is edited in place, so it is never shared.
+    Files that already have other links are assumed to be stored. Returns the
+    number of bytes freed.
+    """
+    freed = 0
+    for checkpoint_file in listdir(checkpoint):
+        path = join(checkpoint, checkpoint_file)
+        if checkpoint_file == 'config' or isdir(path):
+            continue
+        stats = lstat(path)
+        if stats.st_nlink > 1:
+            continue
+        hash_ = file_hash(path)
+        makedirs(join(store, hash_[:2]), exist_ok=True)
+        blob = join(store, hash_[:2], hash_)
+        try:
+            link(path, blob)
+        except FileExistsError:
+            # replace the file atomically so that the checkpoint is never
+            # missing a file if interrupted
+            temp = '{}.store'.format(path)
+            link(blob, temp)
+            rename(temp, path)
+            freed += stats.st_blocks*512
+    return freed
+
+
+def store_campaign(campaign_id, store=checkpoint_store):
+    """
+    Store every gold checkpoint of campaign_id (merged checkpoints are
+    derived and evictable, so they are left alone) and return the number of
+    bytes freed.
+    """
+    gold_directory = 'simics-workspace/gold-checkpoints/{}'.format(
+        campaign_id)
+    freed = 0
+    for checkpoint in listdir(gold_directory):
+        if checkpoint.isdigit() and \
+                isdir(join(gold_directory, checkpoint)):
+            freed += store_checkpoint(join(gold_directory, checkpoint), store)
+    return freed
+
+
+def collect_garbage(store=checkpoint_store):
+    """
+    Delete the blobs that are no longer linked from any checkpoint and return
+    the number of bytes freed.
+    """
+    freed = 0
+    if not exists(store):
+        return freed
+    for prefix in listdir(store):
+        for blob in listdir(join(store, prefix)):
+            stats = lstat(join(store, prefix, blob))
+            if stats.st_nlink == 1:
+                remove(join(store, prefix, blob))
+                freed += stats.st_blocks*512
+        if not listdir(join(store, prefix)):
+            rmdir(join(store, prefix))
+    return freed
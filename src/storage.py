@@ -0,0 +1,208 @@
+"""
+Copyright (c) 2018 NSF Center for Space, High-performance, and Resilient Computing (SHREC)
+University of Pittsburgh. All rights reserved.
+
+Redistribution and use in source and binary forms, with or without modification, are permitted provided
+that the following conditions are met:
+1. Redistributions of source code must retain the above copyright notice,
+   this list of conditions and the following disclaimer.
+2. Redistributions in binary form must reproduce the above copyright notice,
+   this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS AS IS AND ANY EXPRESS OR IMPLIED WARRANTIES, 
+INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. 
+IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR 
+CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT 
+(INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY
+OF SUCH DAMAGE.
+"""
+
+from collections import deque
+from fcntl import flock, LOCK_EX, LOCK_NB
+from glob import glob
+from os import lstat, makedirs, remove, statvfs, symlink, walk
+from os.path import abspath, basename, dirname, exists, islink, join, realpath
+from queue import Queue
+from shutil import rmtree
+from tempfile import mkdtemp
+from termcolor import colored
+from threading import Thread
+from time import perf_counter, time
+from traceback import format_exc
+
+
+def disk_usage(directory, inodes=None):
+    """
+    Returns the disk space used by the files in directory. Hard links (gold
+    checkpoint files shared with injected checkpoints, merged checkpoints, or
+    the checkpoint store) are only counted once, and not at all if they are
+    already in inodes, which is updated with the files of directory.
+    """
+    if inodes is None:
+        inodes = set()
+    usage = 0
+    for root, dirs, files in walk(directory):
+        for file_ in files:
+            try:
+                stats = lstat(join(root, file_))
+            except FileNotFoundError:
+                continue
+            if (stats.st_dev, stats.st_ino) not in inodes:
+                inodes.add((stats.st_dev, stats.st_ino))
+                usage += stats.st_blocks*512
+    return usage
+
+
+class storage(object):
+    """
+    Manages the disk space used by injections. Per-iteration injected
+    checkpoints are staged on a RAM disk when it has room, directories are
+    deleted by a background thread instead of the injection loop, and merged
+    gold checkpoints and result files are evicted least recently used first
+    when simics-workspace or campaign-data grow past their quotas. Merged
+    gold checkpoints are not evicted while they are locked (see
+    lock_merged_checkpoint), only the files of finished results are evicted
+    and they are logged on their results.
+    """
+    staging_reserve = 256 << 20
+    enforce_interval = 60
+    min_age = 600
+
+    def __init__(self, options, db):
+        self.db = db
+        self.debug = options.debug
+        self.staging = abspath(options.staging) if options.staging else None
+        self.workspace_quota = options.workspace_quota
+        self.data_quota = options.data_quota
+        self.last_enforce = None
+        # (result id, description) of evicted result directories, logged from
+        # the thread using the database
+        self.evicted = deque()
+        self.queue = Queue()
+        self.thread = Thread(target=self.__worker, daemon=True)
+        self.thread.start()
+
+    def stage(self, directory):
+        """
+        Create directory, as a link to a new directory on the staging RAM disk
+        if it has at least staging_reserve bytes free. The files of the
+        directory are linked from the gold checkpoint where possible, so only
+        the files written by Simics take up space on the RAM disk.
+        """
+        if self.staging and exists(self.staging):
+            stats = statvfs(self.staging)
+            if stats.f_bavail*stats.f_frsize >= self.staging_reserve:
+                makedirs(dirname(directory), exist_ok=True)
+                symlink(mkdtemp(prefix='drseus-{}-'.format(
+                    basename(directory)), dir=self.staging), directory)
+                return
+        makedirs(directory, exist_ok=True)
+
+    def delete(self, directory):
+        """
+        Delete directory (and its staging directory) in the background.
+        """
+        if islink(directory):
+            staged = realpath(directory)
+            remove(directory)
+            directory = staged
+        self.queue.put((rmtree, (directory, True)))
+
+    def enforce(self):
+        """
+        Evict in the background until the quotas are met, at most once every
+        enforce_interval seconds since walking campaign-data is not free.
+        """
+        if self.workspace_quota is None and self.data_quota is None:
+            return
+        self.__log_evictions()
+        if self.last_enforce is not None and \
+                perf_counter() - self.last_enforce < self.enforce_interval:
+            return
+        self.last_enforce = perf_counter()
+        # results are only looked up from this thread
+        if self.data_quota is None:
+            results = []
+        else:
+            results = ['campaign-data/{}/results/{}'.format(campaign, result)
+                       for campaign, result in self.db.get_finished_results()]
+        self.queue.put((self.__evict, (results,)))
+
+    def close(self):
+        """
+        Wait for the pending deletions to finish.
+        """
+        self.queue.put(None)
+        self.thread.join()
+        self.__log_evictions()
+
+    def __log_evictions(self):
+        while self.evicted:
+            self.db.log_evicted_result(*self.evicted.popleft())
+
+    def __worker(self):
+        while True:
+            task = self.queue.get()
+            if task is None:
+                break
+            function, arguments = task
+            try:
+                function(*arguments)
+            except Exception:
+                # the database is not used from this thread
+                print(colored('error managing storage:\n{}'.format(
+                    format_exc()), 'red'))
+
+    def __evict(self, results):
+
+        def last_used(path):
+            # merge_checkpoint truncates the lock file every time the merged
+            # checkpoint is used, so its mtime is the time of last use
+            lock = '{}.lock'.format(path)
+            try:
+                return max(lstat(path).st_mtime, lstat(lock).st_mtime)
+            except FileNotFoundError:
+                return lstat(path).st_mtime
+
+        def evict(directory, quota, candidates):
+            usage = disk_usage(directory)
+            if usage <= quota:
+                return
+            candidates = sorted(
+                (last_used(candidate), candidate)
+                for candidate in candidates if exists(candidate))
+            for used, candidate in candidates:
+                if usage <= quota or time() - used < self.min_age:
+                    break
+                lock_file = '{}.lock'.format(candidate)
+                lock = open(lock_file, 'a') if exists(lock_file) else None
+                try:
+                    if lock is not None:
+                        # skip merged checkpoints that are being merged or
+                        # read
+                        try:
+                            flock(lock, LOCK_EX | LOCK_NB)
+                        except BlockingIOError:
+                            continue
+                    size = disk_usage(candidate)
+                    rmtree(candidate, ignore_errors=True)
+                    usage -= size
+                    description = 'evicted {} ({:.1f} MB)'.format(
+                        abspath(candidate), size/2**20)
+                    if self.debug:
+                        print(colored(description, 'yellow'))
+                    if basename(dirname(candidate)) == 'results' and \
+                            basename(candidate).isdigit():
+                        self.evicted.append((int(basename(candidate)),
+                                             description))
+                finally:
+                    if lock is not None:
+                        lock.close()
+
+    # def __evict(self, results):
+        if self.workspace_quota is not None:
+            evict('simics-workspace', self.workspace_quota*2**30,
+                  glob('simics-workspace/gold-checkpoints/*/*_merged'))
+        if self.data_quota is not None:
+            evict('campaign-data', self.data_quota*2**30, results)
@@ -47,6 +47,19 @@ class supervisor(Cmd):
         options.latent_iterations = 0
         options.compare_all = False
         options.extract_blocks = False
+        options.merge = True
+        options.converge = False
+        options.max_speed = False
+        options.memoize = False
+        options.prune = False
+        options.live_injection = False
+        options.host_files = False
+        options.sub_checkpoint = False
+        options.persistent_simics = False
+        options.licenses = None
+        options.staging = None
+        options.workspace_quota = None
+        options.data_quota = None
         if options.power_switch_outlet is not None or \
                 options.power_switch_ip_address:
             switch = power_switch(options)
@@ -237,6 +250,19 @@ class supervisor(Cmd):
         self.drseus.options.processes = options.processes
         self.drseus.options.compare_all = options.compare_all
         self.drseus.options.extract_blocks = options.extract_blocks
+        self.drseus.options.merge = options.merge
+        self.drseus.options.converge = options.converge
+        self.drseus.options.max_speed = options.max_speed
+        self.drseus.options.memoize = options.memoize
+        self.drseus.options.prune = options.prune
+        self.drseus.options.live_injection = options.live_injection
+        self.drseus.options.host_files = options.host_files
+        self.drseus.options.sub_checkpoint = options.sub_checkpoint
+        self.drseus.options.persistent_simics = options.persistent_simics
+        self.drseus.options.licenses = options.licenses
+        self.drseus.options.staging = options.staging
+        self.drseus.options.workspace_quota = options.workspace_quota
+        self.drseus.options.data_quota = options.data_quota
         self.drseus.debugger.set_targets()
         if options.iterations is None:
             iteration_counter = None
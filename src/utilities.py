@@ -42,8 +42,13 @@ from .database import (backup_database, delete_database, get_campaign,
 from .fault_injector import fault_injector
 from .jtag import find_devices
 from .jtag.openocd import openocd
+from .log.models import output_chunk as output_chunk_model
 from .power_switch import power_switch
 from .simics.config import simics_config
+from .simics.merge import merge_gold_checkpoints
+from .simics.store import (checkpoint_store, collect_garbage,
+                           store_campaign)
+from .storage import disk_usage
 from .supervisor import supervisor
 
 
@@ -219,6 +224,8 @@ def delete(options):
                 options.campaign_id))
             print('deleted injected checkpoints')
         if campaign is not None:
+            output_chunk_model.objects.filter(
+                result__campaign=campaign).delete()
             campaign.result_set.all().delete()
             print('deleted campaign {} results from database'.format(
                 options.campaign_id))
@@ -234,12 +241,19 @@ def delete(options):
             rmtree('simics-workspace/gold-checkpoints/{}'.format(
                 options.campaign_id))
             print('deleted gold checkpoints')
+            freed = collect_garbage()
+            if freed:
+                print('deleted {:.1f} MB of unshared checkpoint files'.format(
+                    freed / (1 << 20)))
         if exists('simics-workspace/injected-checkpoints/{}'.format(
                 options.campaign_id)):
             rmtree('simics-workspace/injected-checkpoints/{}'.format(
                 options.campaign_id))
             print('deleted injected checkpoints')
         if campaign is not None:
+            output_chunk_model.objects.filter(
+                result__campaign=campaign).delete()
+            campaign.output_chunk_set.all().delete()
             campaign.delete()
             print('deleted campaign {} from database'.format(
                 options.campaign_id))
@@ -250,6 +264,9 @@ def delete(options):
         if exists('simics-workspace/gold-checkpoints'):
             rmtree('simics-workspace/gold-checkpoints')
             print('deleted gold checkpoints')
+        if exists(checkpoint_store):
+            rmtree(checkpoint_store)
+            print('deleted checkpoint store')
         if exists('simics-workspace/injected-checkpoints'):
             rmtree('simics-workspace/injected-checkpoints')
             print('deleted injected checkpoints')
@@ -369,6 +386,65 @@ def regenerate(options):
         campaign.id, options.result_id))
 
 
+def merge_checkpoints(options):
+    campaign = get_campaign(options)
+    if not campaign.simics:
+        raise Exception('this feature is only available for Simics campaigns')
+    print('merging gold checkpoints...', end='')
+    stdout.flush()
+    merge_gold_checkpoints(campaign.id, campaign.checkpoints, options.processes)
+    print('done')
+
+
+def checkpoint_cost(options):
+    campaign = get_campaign(options)
+    if not campaign.simics:
+        raise Exception('this feature is only available for Simics campaigns')
+    gold_directory = 'simics-workspace/gold-checkpoints/{}'.format(campaign.id)
+    checkpoints = sorted(
+        checkpoint for checkpoint in listdir(gold_directory)
+        if isdir(join(gold_directory, checkpoint)))
+    incremental_size = merged_size = merged = 0
+    # files hard linked between checkpoints (e.g. the unchanged files of
+    # merged checkpoints) are only counted once
+    inodes = set()
+    for checkpoint in checkpoints:
+        if not checkpoint.endswith('_merged'):
+            incremental_size += disk_usage(join(gold_directory, checkpoint),
+                                           inodes)
+    for checkpoint in checkpoints:
+        if checkpoint.endswith('_merged'):
+            merged_size += disk_usage(join(gold_directory, checkpoint),
+                                      inodes)
+            merged += 1
+    # incremental checkpoints are assumed to have the same size at any
+    # interval, which overestimates the disk used by denser checkpoints
+    incremental_size /= campaign.checkpoints
+    if merged:
+        merged_size /= merged
+    columns = ['Checkpoints', 'Cycles between', 'Mean fast-forward (cycles)']
+    if options.rate:
+        columns.append('Mean fast-forward (s)')
+    columns.append('Gold disk (MiB)')
+    table = AsciiTable([columns], 'Campaign {} checkpoint density ({} cycles, '
+                                  '{} checkpoints)'.format(
+                                      campaign.id, campaign.cycles,
+                                      campaign.checkpoints))
+    for factor in (0.125, 0.25, 0.5, 1, 2, 4, 8):
+        checkpoints = max(2, int(round(campaign.checkpoints*factor)))
+        cycles_between = campaign.cycles // checkpoints
+        # sub-checkpoint injections are uniformly distributed between
+        # checkpoints, so on average half of an interval is fast-forwarded
+        fast_forward = cycles_between / 2
+        row = [checkpoints, cycles_between, '{:.0f}'.format(fast_forward)]
+        if options.rate:
+            row.append('{:.2f}'.format(fast_forward / options.rate))
+        row.append('{:.1f}'.format(
+            checkpoints*(incremental_size+merged_size) / (1 << 20)))
+        table.table_data.append([str(item) for item in row])
+    print(table.table)
+
+
 def view_log(options):
     django_command([argv[0], 'runserver', ('0.0.0.0:' if options.external
                                            else '')+str(options.port)])
@@ -386,6 +462,9 @@ def update_dependencies(*args):
     def update_checkpoint_dependencies(campaign_id):
         for checkpoint in listdir('simics-workspace/gold-checkpoints/{}'.format(
                 campaign_id)):
+            if not isdir('simics-workspace/gold-checkpoints/{}/{}'.format(
+                    campaign_id, checkpoint)):
+                continue
             with simics_config('simics-workspace/gold-checkpoints/{}/{}'.format(
                     campaign_id, checkpoint)) as config:
                 paths = config.get(config, 'sim', 'checkpoint_path')
@@ -457,6 +536,11 @@ def backup(options):
                       for unit in datetime.now().timetuple()[3:6]]))
         num_items = 0
         directories = ['campaign-data']
+        # files shared through the checkpoint store are hard links, which are
+        # archived once and linked by the rest of the gold checkpoints
+        if exists(checkpoint_store):
+            collect_garbage()
+            directories.append(checkpoint_store)
         if exists('simics-workspace/gold-checkpoints'):
             directories.append('simics-workspace/gold-checkpoints')
         print('discovering files to archive')
@@ -489,11 +573,21 @@ def restore(options):
                 rmtree('campaign-data')
             if exists('simics-workspace/gold-checkpoints'):
                 rmtree('simics-workspace/gold-checkpoints')
+            if exists(checkpoint_store):
+                rmtree(checkpoint_store)
         print('restoring files...', end='')
         stdout.flush()
         with open_tar(options.backup_file, 'r:gz') as backup:
             backup.extractall()
         print('done')
+        # backups made before the checkpoint store have a full copy of every
+        # checkpoint file
+        if exists('simics-workspace/gold-checkpoints'):
+            print('deduplicating gold checkpoints...', end='')
+            stdout.flush()
+            freed = sum(store_campaign(campaign) for campaign in listdir(
+                'simics-workspace/gold-checkpoints'))
+            print('done ({:.1f} MB freed)'.format(freed / (1 << 20)))
     for item in listdir('campaign-data'):
         if '.sql' in item:
             print('restoring database from {}...'.format(item))